@@ -0,0 +1,89 @@
+"""
+Memory benchmark for streaming windows: runs the Walmart updater on a
+synthetic sheet of N rows against a local mock scrape.do, with and without
+--window, and reports the peak RSS of each run. With windows the peak
+should stay flat as N grows.
+
+Each run is a fresh process (ru_maxrss only ever grows). No credentials or
+network needed: the sheet is generated on the fly, writes are only counted.
+
+    python benchmarks/bench_memory.py
+    python benchmarks/bench_memory.py --rows 2000 20000 100000 --window 1000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_services import FakeWorksheet, MockProxy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEADER = ["Walmart Link", "Today Price", "Old Price", "Today Stock", "Old Stock",
+          "BuyBox Winner", "Stock Update Date", "Flag"]
+PRODUCTS = 50  # distinct product pages, rows cycle through them
+
+
+def make_row(r):
+    return [f"https://www.walmart.com/ip/item/{r % PRODUCTS}", "9.99", "", "100", "", "Walmart", "", ""]
+
+
+def child(rows, window):
+    """One updater run in this process, prints a JSON line with the measurements."""
+    # Every product page is the same in-stock page, like the original fixed mock
+    proxy = MockProxy().start()
+    proxy.pages["walmart"] = proxy.pages["walmart"][1:2]
+    os.environ["SCRAPE_DO_ENDPOINT"] = proxy.url
+    os.environ["SCRAPER_PARSE_WORKERS"] = "0"
+    sys.path.insert(0, ROOT)
+    import walmart_sheet_updater as updater
+
+    updater.SHEETS_MAX_WRITES_PER_SEC = None  # the fake sheet has no quota
+    sheet = FakeWorksheet(HEADER, rows, make_row, store_writes=False)
+    argv = [str(2), str(rows + 1), "--no-cache", f"--window={window}"]
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            updater.run(updater.parse_args(argv), sheet=sheet, api_key="bench")
+        finally:
+            updater.get_run_log().close()
+            sys.stdout = stdout
+    print(json.dumps({
+        "seconds": time.perf_counter() - started,
+        "baseline_mb": baseline_kb / 1024,
+        "peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "batch_updates": sheet.calls["batch_update"],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[2000, 20000], help="job sizes to run")
+    parser.add_argument("--window", type=int, default=1000, help="rows per streaming window")
+    parser.add_argument("--child", nargs=2, type=int, metavar=("ROWS", "WINDOW"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    print(f"{'rows':>8} {'window':>7} {'seconds':>8} {'base MB':>8} {'peak MB':>8} {'growth MB':>10}")
+    for rows in args.rows:
+        for window in (0, args.window):
+            # Scratch cwd: scraper.log and run_journal.jsonl land there
+            with tempfile.TemporaryDirectory() as scratch:
+                out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", str(rows), str(window)],
+                                     cwd=scratch, capture_output=True, text=True, check=True)
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{rows:8d} {window or '-':>7} {result['seconds']:8.1f} {result['baseline_mb']:8.1f} "
+                  f"{result['peak_mb']:8.1f} {result['peak_mb'] - result['baseline_mb']:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
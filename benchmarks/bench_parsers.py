@@ -0,0 +1,70 @@
+"""
+Walmart parser benchmark: checks every engine returns the same (price, stock, seller)
+as the BeautifulSoup reference on saved pages, and reports ms/page and speedup.
+
+    python benchmarks/bench_parsers.py                      # bundled fixtures
+    python benchmarks/bench_parsers.py --fixtures saved/ -n 20
+"""
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsers import WALMART_ENGINES  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "walmart")
+
+
+def time_engine(parse, pages, repeat):
+    # Parsers print diagnostics, keep them out of the timing output
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for html in pages:
+                parse(html)
+        elapsed = time.perf_counter() - started
+    return elapsed / (repeat * len(pages)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="directory of saved Walmart .html pages")
+    parser.add_argument("-n", "--repeat", type=int, default=10, help="passes over the fixture set per engine")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.fixtures, "*.html")))
+    if not paths:
+        sys.exit(f"No .html fixtures in {args.fixtures}")
+    pages = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            pages.append(f.read())
+
+    # 1. Correctness: every engine must match the soup reference
+    mismatches = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        reference = [WALMART_ENGINES["soup"](html) for html in pages]
+        results = {name: [parse(html) for html in pages] for name, parse in WALMART_ENGINES.items()}
+    for name, engine_results in results.items():
+        for path, expected, got in zip(paths, reference, engine_results):
+            if got != expected:
+                mismatches += 1
+                print(f"❌ {name} mismatch on {os.path.basename(path)}: {got!r} != {expected!r}")
+    print(f"✅ {len(paths)} pages, {len(WALMART_ENGINES)} engines, {mismatches} mismatches")
+
+    # 2. Speed
+    timings = {name: time_engine(parse, pages, args.repeat) for name, parse in WALMART_ENGINES.items()}
+    baseline = timings["soup"]
+    for name, ms in timings.items():
+        print(f"{name:>5}: {ms:8.2f} ms/page  x{baseline / ms:5.1f}")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
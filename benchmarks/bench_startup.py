@@ -0,0 +1,51 @@
+"""
+Startup benchmark: how long a fresh interpreter takes to import each entry
+module, and which heavy dependencies the import pulls in. The frontend pays
+this on every Start click, before the first request goes out.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py -n 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["walmart_sheet_updater", "scraper"]
+HEAVY = ["streamlit", "gspread", "oauth2client", "pandas", "bs4", "lxml", "aiohttp", "requests"]
+
+PROBE = (
+    "import sys, time; t = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - t); print(','.join(m for m in {heavy!r} if m in sys.modules))"
+)
+
+
+def probe(module):
+    """Imports `module` in a fresh interpreter, returns (wall seconds, import seconds, heavy modules loaded)."""
+    started = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout.splitlines()
+    return time.perf_counter() - started, float(out[0]), out[1] if len(out) > 1 else ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="fresh interpreters per module")
+    args = parser.parse_args()
+
+    print(f"{'module':24s}{'process ms':>12s}{'import ms':>12s}  heavy deps loaded")
+    for module in MODULES:
+        runs = [probe(module) for _ in range(args.repeat)]
+        wall = statistics.median(r[0] for r in runs) * 1000
+        imported = statistics.median(r[1] for r in runs) * 1000
+        print(f"{module:24s}{wall:12.0f}{imported:12.0f}  {runs[-1][2] or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Throughput benchmark: runs walmart_sheet_updater and scraper.update_google_sheet
+end to end against a local mock proxy (saved Walmart / Amazon / eBay pages,
+configurable latency, injected 5xx, 429s and captcha pages) and an in-memory worksheet that
+counts Sheets API calls. Reports per target:
+
+    rows/s, proxy requests per row, Sheets API calls per row (by method),
+    parse CPU ms per page and the peak RSS growth of the run.
+
+Parse time is the CPU time of the parser calls, so it is not inflated by the
+fetch threads competing for the GIL. It is only measured with parse workers
+inline (--parse-workers 0, the default here).
+
+Each target runs in a fresh process in a scratch directory (no credentials,
+no network, nothing written next to the code). Compare two commits by running
+the same command on both.
+
+    python benchmarks/bench_throughput.py
+    python benchmarks/bench_throughput.py --target updater --rows 2000 --latency 0.2 --throttle-rate 0.05
+    python benchmarks/bench_throughput.py --error-rate 0.02 --window 500 --json
+    python benchmarks/bench_throughput.py --target updater --runs 2    # second, unchanged run
+    python benchmarks/bench_throughput.py --target updater --jobs 4    # 4 sheets, one fetch pool
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from mock_services import FakeWorksheet, MockProxy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGETS = ("updater", "scraper")
+
+UPDATER_HEADER = ["Walmart Link", "Today Price", "Old Price", "Today Stock", "Old Stock",
+                  "BuyBox Winner", "Stock Update Date", "Flag"]
+SCRAPER_HEADER = ["Item Link", "Old Price", "New Price", "In Stock", "Price change",
+                  "Available Quantity", "Sold Quantity"]
+
+
+def updater_row(products):
+    def make_row(r):
+        n = r % products
+        # Every 10th row holds two links, like multi-pack rows in the real sheet
+        link = f"https://www.walmart.com/ip/item/{n}"
+        if r % 10 == 0:
+            link += f" https://www.walmart.com/ip/item/{(n + 1) % products}"
+        return [link, "9.99", "", "100", "", "Walmart", "", ""]
+    return make_row
+
+
+def scraper_row(products):
+    def make_row(r):
+        n = r % products
+        link = (f"https://www.walmart.com/ip/item/{n}", f"https://www.amazon.com/dp/B{n:09d}",
+                f"https://www.ebay.com/itm/{n}")[n % 3]
+        return [link, "19.95", "", "", "", "", ""]
+    return make_row
+
+
+def cpu_timed(fn, timings):
+    """`fn`, appending the CPU seconds of each call (of the calling thread) to `timings`."""
+    def timed(*args):
+        started = time.thread_time()
+        try:
+            return fn(*args)
+        finally:
+            timings.append(time.thread_time() - started)
+    return timed
+
+
+def updater_job(args, proxy, sheets, timings):
+    """(run, close) for the updater target, through job_runner when there are several sheets."""
+    os.environ["SCRAPE_DO_ENDPOINT"] = proxy.url
+    import walmart_sheet_updater as updater
+
+    if not args.parse_workers:
+        import parsers
+        parsers.WALMART_ENGINES.update({name: cpu_timed(fn, timings) for name, fn in parsers.WALMART_ENGINES.items()})
+    if not args.sheets_quota:
+        updater.SHEETS_MAX_WRITES_PER_SEC = None
+    argv = ["2", str(args.rows + 1), "--no-cache", f"--window={args.window}"]
+    if args.no_fingerprints:
+        argv.append("--no-fingerprints")
+
+    def run():
+        updater.run(updater.parse_args(argv), sheet=sheets[0], api_key="bench")
+
+    def run_fleet():
+        # One job per fake spreadsheet, all on one fetch pool
+        import job_runner
+        specs = [{"name": f"sheet{n}", "sheet": f"https://docs.google.com/spreadsheets/d/bench{n}/edit",
+                  "args": [str(first), str(first + rows - 1)]}
+                 for n, (first, rows) in enumerate(fleet_rows(args))]
+        by_name = dict(zip((spec["name"] for spec in specs), sheets))
+        job_runner.run_jobs(specs, argv[2:], api_key="bench", open_sheet=lambda spec: by_name[spec["name"]])
+    return run_fleet if len(sheets) > 1 else run, lambda: updater.get_run_log().close()
+
+
+def fleet_rows(args):
+    """(first row, rows) of each sheet when --rows are split over --jobs sheets."""
+    per_sheet, extra = divmod(args.rows, args.jobs)
+    return [(2, per_sheet + (n < extra)) for n in range(args.jobs)]
+
+
+def scraper_job(args, proxy, sheets, timings):
+    """(run, close) for the scraper target."""
+    os.environ["SCRAPINGANT_ENDPOINT"] = proxy.url
+    import scraper
+    from rate_control import RateController
+
+    scraper._secrets = {"api_keys": {"scraping_ant": "bench"}}
+    if not args.sheets_quota:
+        scraper.sheets_rate = RateController("Google Sheets", max_concurrency=1)
+
+    stage = scraper.get_parse_stage()
+    if not args.parse_workers:
+        parse_stage_run = stage.run
+        stage.run = lambda fn, *fn_args: parse_stage_run(cpu_timed(fn, timings), *fn_args)
+
+    def run():
+        scraper.update_google_sheet(sheets[0], use_cache=False, window_rows=args.window)
+    return run, stage.close
+
+
+def child(args):
+    """One target in this process, prints a JSON line with the measurements."""
+    proxy = MockProxy(latency=args.latency, error_rate=args.error_rate,
+                      throttle_rate=args.throttle_rate, blocked_rate=args.blocked_rate, seed=args.seed).start()
+    os.environ["SCRAPER_CONCURRENCY"] = str(args.concurrency)
+    os.environ["SCRAPER_PARSE_WORKERS"] = str(args.parse_workers)
+    sys.path.insert(0, ROOT)
+    if args.child == "updater":
+        sheets = [FakeWorksheet(UPDATER_HEADER, rows, updater_row(args.products)) for _, rows in fleet_rows(args)]
+        job = updater_job
+    else:
+        sheets = [FakeWorksheet(SCRAPER_HEADER, args.rows, scraper_row(args.products))]
+        job = scraper_job
+
+    timings = []  # parse CPU seconds per page
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        run, close = job(args, proxy, sheets, timings)
+        try:
+            for _ in range(args.runs):
+                # Earlier runs only leave their state behind (sheet values, fingerprints), the last is measured
+                proxy.requests.clear()
+                for sheet in sheets:
+                    sheet.calls.clear()
+                    sheet.cells_written = 0
+                timings.clear()
+                baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                started = time.perf_counter()
+                run()
+                seconds = time.perf_counter() - started
+        finally:
+            close()
+            sys.stdout = stdout
+    proxy.close()
+    print(json.dumps({
+        "target": args.child,
+        "rows": args.rows,
+        "seconds": round(seconds, 3),
+        "rows_per_s": round(args.rows / seconds, 2),
+        "proxy_requests": dict(proxy.requests),
+        "jobs": len(sheets),
+        "sheets_calls": dict(sum((sheet.calls for sheet in sheets), Counter())),
+        "cells_written": sum(sheet.cells_written for sheet in sheets),
+        "pages_parsed": len(timings),
+        "parse_ms_per_page": round(sum(timings) / len(timings) * 1000, 3) if timings else None,
+        "peak_growth_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_kb) / 1024, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=TARGETS + ("all",), default="all")
+    parser.add_argument("--rows", type=int, default=500, help="sheet rows to update")
+    parser.add_argument("--products", type=int, default=200, help="distinct products, rows cycle through them")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock proxy seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of proxy requests answering 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of proxy requests answering 429")
+    parser.add_argument("--blocked-rate", type=float, default=0.0, help="share of proxy requests answering a captcha page")
+    parser.add_argument("--concurrency", type=int, default=20, help="SCRAPER_CONCURRENCY for the run")
+    parser.add_argument("--parse-workers", type=int, default=0,
+                        help="SCRAPER_PARSE_WORKERS (parse time is only measured with 0 = inline)")
+    parser.add_argument("--window", type=int, default=0, help="streaming window rows, 0 = whole job")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="updater: split the rows over N sheets run by job_runner on one fetch pool")
+    parser.add_argument("--runs", type=int, default=1,
+                        help="run the target N times on the same sheet and scratch dir, report the last (steady state)")
+    parser.add_argument("--no-fingerprints", action="store_true", help="updater: parse every fetched page")
+    parser.add_argument("--sheets-quota", action="store_true", help="keep the real Sheets write pacing")
+    parser.add_argument("--seed", type=int, default=0, help="error / 429 / captcha injection seed")
+    parser.add_argument("--json", action="store_true", help="print the raw JSON results")
+    parser.add_argument("--child", choices=TARGETS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    results = []
+    for target in (TARGETS if args.target == "all" else (args.target,)):
+        # Scratch cwd: scraper.log, run_journal.jsonl, scraper_metrics.jsonl land there
+        with tempfile.TemporaryDirectory() as scratch:
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", target] + sys.argv[1:],
+                                 cwd=scratch, capture_output=True, text=True)
+        if out.returncode:
+            sys.exit(f"{target} run failed:\n{out.stderr}")
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'target':8} {'rows':>6} {'seconds':>8} {'rows/s':>8} {'proxy/row':>10} {'sheets/row':>11} "
+          f"{'parse ms':>9} {'peak MB':>8}")
+    for r in results:
+        proxy = sum(r["proxy_requests"].values())
+        sheets = sum(r["sheets_calls"].values())
+        parse_ms = f"{r['parse_ms_per_page']:9.2f}" if r["parse_ms_per_page"] is not None else f"{'-':>9}"
+        print(f"{r['target']:8} {r['rows']:6d} {r['seconds']:8.1f} {r['rows_per_s']:8.1f} "
+              f"{proxy / r['rows']:10.2f} {sheets / r['rows']:11.3f} {parse_ms} {r['peak_growth_mb']:8.1f}")
+    for r in results:
+        calls = ", ".join(f"{name}={n}" for name, n in sorted(r["sheets_calls"].items()))
+        statuses = ", ".join(f"{status}={n}" for status, n in sorted(r["proxy_requests"].items()))
+        print(f"  {r['target']}: sheets {calls}; proxy {statuses}; {r['cells_written']} cells written; "
+              f"{r['pages_parsed']} pages parsed")
+
+
+if __name__ == "__main__":
+    main()
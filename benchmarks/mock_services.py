@@ -0,0 +1,193 @@
+"""
+Local stand-ins for the services a run talks to, shared by the benchmarks:
+
+- MockProxy: scrape.do / ScrapingAnt compatible HTTP server (the target page is
+  the `url` query parameter) that answers with the saved pages in
+  fixtures/<site>/, with configurable latency and injected 5xx / 429 / captcha
+  responses.
+- FakeWorksheet: in-memory gspread worksheet whose cells are computed from the
+  row number, counting every API call the code under test makes.
+
+Point the code at the proxy with SCRAPE_DO_ENDPOINT / SCRAPINGANT_ENDPOINT
+(set before importing it) and hand it the worksheet instead of a real one.
+"""
+import glob
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SITES = ("walmart", "amazon", "ebay")
+
+_A1 = re.compile(r"^([A-Z]+)(\d+)(?::([A-Z]+)(\d*))?$")
+_DIGITS = re.compile(r"(\d+)\D*$")
+
+
+BLOCKED_PAGE = b"<html><head><title>Robot or human?</title></head><body><div id=\"px-captcha\"></div></body></html>"
+
+
+def load_fixtures(fixtures_dir=FIXTURES_DIR):
+    """{site: [page bytes, ...]} from fixtures/<site>/*.html, sorted by file name."""
+    pages = {}
+    for site in SITES:
+        paths = sorted(glob.glob(os.path.join(fixtures_dir, site, "*.html")))
+        if paths:
+            pages[site] = [open(path, "rb").read() for path in paths]
+    return pages
+
+
+class MockProxy:
+    """
+    Fetch proxy on 127.0.0.1. The page served for a target URL is picked by its
+    site (walmart / amazon / ebay in the host) and the last number in it, so
+    the same product always gets the same page.
+
+    `latency` seconds are slept per request, `error_rate` / `throttle_rate` of
+    the requests answer 500 / 429 instead and `blocked_rate` of them a 200
+    captcha page. `requests` counts answers by status ("blocked" for those).
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, throttle_rate=0.0, blocked_rate=0.0, seed=0,
+                 fixtures_dir=FIXTURES_DIR):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.blocked_rate = blocked_rate
+        self.pages = load_fixtures(fixtures_dir)
+        self.requests = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/"
+
+    def respond(self, target):
+        """(status, body) for one proxied request."""
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.throttle_rate:
+            return 429, b"Too Many Requests"
+        if roll < self.throttle_rate + self.error_rate:
+            return 500, b"Internal Server Error"
+        if roll < self.throttle_rate + self.error_rate + self.blocked_rate:
+            return "blocked", BLOCKED_PAGE
+        host = urlsplit(target).netloc
+        site = next((s for s in SITES if s in host), None)
+        if site not in self.pages:
+            return 404, b"Not Found"
+        digits = _DIGITS.search(target)
+        n = int(digits.group(1)) if digits else sum(target.encode())
+        return 200, self.pages[site][n % len(self.pages[site])]
+
+    def start(self):
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real proxy
+
+            def do_GET(self):
+                target = parse_qs(urlsplit(self.path).query).get("url", [""])[0]
+                if proxy.latency:
+                    time.sleep(proxy.latency)
+                status, body = proxy.respond(target)
+                with proxy._lock:
+                    proxy.requests[status] += 1
+                self.send_response(200 if status == "blocked" else status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 128  # the default 5 resets connections under the fetch concurrency
+            daemon_threads = True
+
+        self._server = Server(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, name="mock-proxy", daemon=True).start()
+        return self
+
+    def close(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def _col(letters):
+    idx = 0
+    for ch in letters:
+        idx = idx * 26 + (ord(ch) - 64)
+    return idx
+
+
+class FakeWorksheet:
+    """
+    gspread Worksheet stand-in: `header` in row 1, row r (2..rows + 1) is
+    make_row(r). Supports the calls the updaters make (row_values, batch_get,
+    batch_update) and counts them in `calls`, plus the cells written.
+
+    Written cells are kept (and read back) only with store_writes=True, so a
+    memory benchmark can run huge sheets without the fake itself growing.
+    """
+
+    def __init__(self, header, rows, make_row, store_writes=True):
+        self.header = list(header)
+        self.make_row = make_row
+        self.last_row = rows + 1
+        self.row_count = self.last_row
+        self.store_writes = store_writes
+        self.calls = Counter()
+        self.cells_written = 0
+        self._written = {}  # (row, col) -> value
+        self._lock = threading.Lock()
+
+    def _row(self, r):
+        row = self.header if r == 1 else self.make_row(r)
+        if self._written:
+            row = list(row)
+            for c in range(1, len(row) + 1):
+                if (r, c) in self._written:
+                    row[c - 1] = self._written[(r, c)]
+        return row
+
+    def row_values(self, r):
+        self.calls["row_values"] += 1
+        return list(self._row(r)) if r <= self.last_row else []
+
+    def batch_get(self, ranges, **kwargs):
+        self.calls["batch_get"] += 1
+        out = []
+        for a1 in ranges:
+            m = _A1.match(a1)
+            c1, r1 = _col(m.group(1)), int(m.group(2))
+            c2 = _col(m.group(3)) if m.group(3) else c1
+            r2 = int(m.group(4)) if m.group(4) else (self.last_row if m.group(3) else r1)
+            values = [self._row(r)[c1 - 1:c2] for r in range(r1, min(r2, self.last_row) + 1)]
+            # Like the API: no trailing empty cells or rows
+            values = [row[:max((i + 1 for i, v in enumerate(row) if v not in ("", None)), default=0)]
+                      for row in values]
+            while values and not values[-1]:
+                values.pop()
+            out.append(values)
+        return out
+
+    def batch_update(self, data, **kwargs):
+        self.calls["batch_update"] += 1
+        for update in data:
+            m = _A1.match(update["range"])
+            r0, c0 = int(m.group(2)), _col(m.group(1))
+            for dr, row in enumerate(update["values"]):
+                for dc, value in enumerate(row):
+                    self.cells_written += 1
+                    if self.store_writes:
+                        with self._lock:
+                            self._written[(r0 + dr, c0 + dc)] = value
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import time
+import urllib.parse
+
+from http_client import make_async_session
+from rate_control import RateController, classify_status, ERROR
+from retry_policy import classify_response
+
+# --- CONFIGURATION ---
+# Point SCRAPE_DO_ENDPOINT at a local mock server to run without the real proxy.
+SCRAPE_DO_ENDPOINT = os.environ.get("SCRAPE_DO_ENDPOINT", "http://api.scrape.do/")
+DEFAULT_CONCURRENCY = 20
+# Optional cap on request starts per second (token bucket), unset = only AIMD concurrency
+SCRAPE_DO_MAX_RATE = float(os.environ.get("SCRAPE_DO_MAX_RATE", 0)) or None
+
+
+class FetchEngine:
+    """
+    Asyncio fetcher for scrape.do with ONE concurrency budget for the whole run.
+    Every link of every row goes through the same gate, so a slow row
+    never holds up the others. The gate's width and pacing come from a
+    RateController, which shrinks it on 429/5xx/timeouts and grows it back
+    on success. Pass the same controller to every engine of a run.
+
+    Usage:
+        async with FetchEngine(api_key, concurrency=20) as engine:
+            html, failure = await engine.fetch_page(url)
+    """
+
+    def __init__(self, api_key, concurrency=DEFAULT_CONCURRENCY, endpoint=SCRAPE_DO_ENDPOINT, log=print, rate=None,
+                 metrics=None):
+        self.api_key = api_key
+        self.metrics = metrics
+        self.concurrency = max(1, int(concurrency))
+        self.endpoint = endpoint
+        self.log = log
+        self.rate = rate or RateController("scrape.do", max_concurrency=self.concurrency,
+                                           max_rate=SCRAPE_DO_MAX_RATE, log=log)
+        self._session = None
+        self._gate = None
+        self._in_flight = 0
+        self._inflight = {}
+        self._claims = {}   # owner -> {key: task}
+        self.dedup_hits = 0
+
+    async def __aenter__(self):
+        self._gate = asyncio.Condition()
+        # Keep-alive pool sized to the concurrency budget
+        self._session = make_async_session(self.concurrency)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+
+    def single_flight(self, key, make_coro, owner=None):
+        """
+        Runs make_coro() ONCE per key until `owner` calls forget_finished().
+        Every caller with the same key awaits the same task, so a product
+        referenced by many rows is fetched and parsed exactly once. Owners
+        (the jobs sharing the engine) also join each other's running tasks,
+        but never another owner's finished one: its result may be what this
+        owner's retry phase wants refetched (the page cache covers the rest).
+        """
+        claims = self._claims.setdefault(owner, {})
+        task = claims.get(key)
+        if task is None:
+            task = self._inflight.get(key)
+            if task is None or task.done():
+                task = asyncio.ensure_future(make_coro())
+                self._inflight[key] = task
+            else:
+                self.dedup_hits += 1
+            claims[key] = task
+        else:
+            self.dedup_hits += 1
+        return task
+
+    def forget_finished(self, owner=None):
+        """
+        Drops `owner`'s finished single_flight tasks, its next call for those
+        keys runs again, other owners keep theirs. Used before a retry phase
+        and between streaming windows, so the map does not keep one task per
+        product for the whole job.
+        """
+        claims = {key: task for key, task in self._claims.pop(owner, {}).items() if not task.done()}
+        if claims:
+            self._claims[owner] = claims
+        # Finished tasks are only reused through a claim
+        self._inflight = {key: task for key, task in self._inflight.items() if not task.done()}
+
+    def build_url(self, url):
+        target_url = urllib.parse.quote(url)
+        return "{}?url={}&token={}".format(self.endpoint, target_url, self.api_key)
+
+    async def _acquire(self):
+        started = time.monotonic()
+        async with self._gate:
+            await self._gate.wait_for(lambda: self._in_flight < self.rate.concurrency)
+            self._in_flight += 1
+        wait = self.rate.wait_time()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        if self.metrics:
+            # Time spent queued for a slot + pacing / 429 cooldown sleeps
+            self.metrics.observe("fetch_wait", time.monotonic() - started)
+
+    async def _release(self):
+        async with self._gate:
+            self._in_flight -= 1
+            self._gate.notify_all()
+
+    async def fetch_page(self, url):
+        """One request. Returns (html or None, retry_policy failure class or None)."""
+        await self._acquire()
+        started = time.monotonic()
+        status = "error"
+        try:
+            async with self._session.get(self.build_url(url)) as response:
+                status = response.status
+                retry_after = response.headers.get("Retry-After", "")
+                self.rate.record(classify_status(response.status),
+                                 retry_after=float(retry_after) if retry_after.isdigit() else None)
+                if response.status != 200:
+                    self.log(f"❌ Scraper.do failed ({response.status}) for {url}")
+                    return None, classify_response(response.status)
+                html = await response.text()
+                failure = classify_response(200, html)
+                if failure:
+                    status = failure
+                    self.log(f"🧱 Scraper.do returned a {failure} page for {url}")
+                return html, failure
+        except Exception as e:
+            self.rate.record(ERROR)
+            self.log(f"⚠️ Exception fetching {url}: {e}")
+            return None, classify_response(None)
+        finally:
+            if self.metrics:
+                self.metrics.observe("fetch", time.monotonic() - started, status=status)
+                self.metrics.count("fetch_status", status=status)
+            await self._release()
@@ -4,9 +4,17 @@ import os
 import sys
 import signal
 import re
+import json
+from progress import PROGRESS_FILE, read_progress, read_job_progress, job_progress_file
 
 LOG_FILE = "scraper.log"
+# The child's stdout / stderr: worker-process diagnostics and tracebacks. Kept out of scraper.log,
+# which the child's RunLog writes and rotates itself
+OUTPUT_FILE = "scraper_output.log"
 LOCK_FILE = "start.txt"
+JOBS_FILE = "jobs.json"
+# Only the end of the log is kept in the page, the full log stays in scraper.log
+LOG_TAIL_CHARS = 64 * 1024
 
 st.set_page_config(page_title="Walmart Sheet Updater", layout="wide")
 st.title("🧾 Walmart Product Sheet Updater")
@@ -16,27 +24,54 @@ if "running" not in st.session_state:
     st.session_state.running = False
 if "logs" not in st.session_state:
     st.session_state.logs = ""
+if "log_offset" not in st.session_state:
+    st.session_state.log_offset = 0  # bytes of scraper.log already in st.session_state.logs
 if "process" not in st.session_state:
     st.session_state.process = None
 
-# --- Auto-refresh logs ---
-refresh_rate = 60
-st.markdown(f"""<meta http-equiv="refresh" content="{refresh_rate}">""", unsafe_allow_html=True)
+# --- Auto-refresh: only the dashboard fragment reruns, every few seconds ---
+refresh_rate = 3
 
-# --- Helper to read logs safely ---
-def read_logs():
-    if os.path.exists(LOG_FILE):
-        with open(LOG_FILE, "r", encoding="utf-8") as f:
-            return f.read()
-    return "No logs yet."
+# --- Helper to tail logs: reads only the bytes appended since the last refresh ---
+def tail_logs():
+    if not os.path.exists(LOG_FILE):
+        return
+    size = os.path.getsize(LOG_FILE)
+    if size < st.session_state.log_offset:
+        # Log was cleared by a new run, or rotated to scraper.log.1
+        st.session_state.log_offset, st.session_state.logs = 0, ""
+    start = max(st.session_state.log_offset, size - LOG_TAIL_CHARS)
+    with open(LOG_FILE, "rb") as f:
+        f.seek(start)
+        chunk = f.read(size - start)
+    if start > st.session_state.log_offset:
+        # Jumped ahead on a big log, start at a line boundary
+        st.session_state.logs = ""
+        chunk = chunk[chunk.find(b"\n") + 1:]
+        start = size - len(chunk)
+    # Only whole lines, a half-written line (or UTF-8 character) waits for the next refresh
+    end = chunk.rfind(b"\n") + 1
+    st.session_state.log_offset = start + end
+    logs = st.session_state.logs + chunk[:end].decode("utf-8", errors="replace")
+    st.session_state.logs = logs[-LOG_TAIL_CHARS:]
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m" if hours else f"{minutes}m {seconds:02d}s"
 
 # --- Sidebar Controls ---
 st.sidebar.header("⚙️ Configuration")
 
 # 1. Mode Selection
-mode = st.sidebar.radio("Select Mode:", ["Range Mode (Start-End)", "List Mode (Specific Rows)"])
+mode = st.sidebar.radio("Select Mode:", ["Range Mode (Start-End)", "List Mode (Specific Rows)",
+                                         "Job List (Several Sheets)"])
 
 final_cmd_args = []
+script = "walmart_sheet_updater.py"
 
 if mode == "Range Mode (Start-End)":
     start_row = st.sidebar.number_input("Start Row", min_value=2, value=2, step=1)
@@ -44,6 +79,23 @@ if mode == "Range Mode (Start-End)":
     st.sidebar.info(f"Will scrape rows: {start_row} to {end_row}")
     final_cmd_args = [str(start_row), str(end_row)]
 
+elif mode == "Job List (Several Sheets)":
+    # Every job runs in one job_runner.py process, sharing the Concurrent Requests budget below
+    st.sidebar.markdown("### Jobs (JSON)")
+    default_jobs = open(JOBS_FILE, encoding="utf-8").read() if os.path.exists(JOBS_FILE) else json.dumps(
+        [{"name": "main", "sheet": "https://docs.google.com/spreadsheets/d/<id>/edit", "tab": 0, "args": ["2", "100"]}],
+        indent=2)
+    jobs_text = st.sidebar.text_area("One entry per sheet / tab: name, sheet, tab, args (rows + flags)",
+                                     default_jobs, height=200)
+    try:
+        jobs = json.loads(jobs_text)
+        if not isinstance(jobs, list) or not all(isinstance(job, dict) and job.get("sheet") for job in jobs):
+            raise ValueError("a list of {\"sheet\": ...} entries is expected")
+        st.sidebar.success(f"{len(jobs)} jobs: {', '.join(str(job.get('name', n + 1)) for n, job in enumerate(jobs))}")
+        script, final_cmd_args = "job_runner.py", [JOBS_FILE]
+    except ValueError as e:
+        st.sidebar.warning(f"Invalid jobs: {e}")
+
 else:
     st.sidebar.markdown("### Paste Row Numbers")
     raw_input = st.sidebar.text_area("Enter rows (comma or new line separated)", "3, 5, 10\n20")
@@ -63,6 +115,25 @@ else:
         else:
             st.sidebar.warning("No valid numbers found.")
 
+# 2. Worker counts per stage: fetch concurrency (shared by every row and link) and parse processes
+concurrency = st.sidebar.number_input("Concurrent Requests", min_value=1, max_value=100, value=20, step=1)
+parse_workers = st.sidebar.number_input("Parse Workers (processes)", min_value=0, max_value=64, value=os.cpu_count() or 1, step=1)
+
+# 3. Page cache (reuse pages fetched within the cache TTL)
+use_cache = st.sidebar.checkbox("Use page cache", value=True)
+# Rows whose price / stock / buybox did not change are left alone unless this is ticked
+rewrite_unchanged = st.sidebar.checkbox("Rewrite unchanged rows", value=False)
+
+# 4. Resume a stopped/crashed run of the same rows (never repeats the Today → Old copy)
+resume = st.sidebar.checkbox("Resume last run", value=False)
+
+# 5. Scheduling: stale / volatile / failed rows first, optionally only rows older than N hours
+prioritize = st.sidebar.checkbox("Priority order (stale, volatile, failed first)", value=False)
+stale_hours = st.sidebar.number_input("Only rows older than (hours, 0 = all)", min_value=0, value=0, step=1)
+
+# 6. Per-link diagnostics in the log (cache hits, fulfillment tags, ...), off for normal runs
+verbose_logs = st.sidebar.checkbox("Verbose logs (debug)", value=False)
+
 st.sidebar.markdown("---")
 
 # --- Lock Check ---
@@ -82,23 +153,42 @@ if start_clicked and not st.session_state.running:
         with open(LOCK_FILE, "w") as lock:
             lock.write("running")
 
-        # Clear logs
+        # Clear logs and the previous run's progress
         with open(LOG_FILE, "w", encoding="utf-8") as f:
             f.write(f"Starting Scraper in {mode}...\n")
+        st.session_state.log_offset, st.session_state.logs = 0, ""
+        for path in [PROGRESS_FILE] + [job_progress_file(name) for name in read_job_progress()]:
+            if os.path.exists(path):
+                os.remove(path)
+        if script == "job_runner.py":
+            with open(JOBS_FILE, "w", encoding="utf-8") as f:
+                f.write(jobs_text)
 
         # Launch Backend
         # We pass the final_cmd_args we built above
-        cmd = [sys.executable, "walmart_sheet_updater.py"] + final_cmd_args
+        cmd = [sys.executable, script] + final_cmd_args
+        if not use_cache:
+            cmd.append("--no-cache")
+        if rewrite_unchanged:
+            cmd.append("--rewrite-unchanged")
+        if resume:
+            cmd.append("--resume")
+        if prioritize:
+            cmd.append("--priority")
+        if stale_hours:
+            cmd.append(f"--stale-hours={stale_hours}")
         
-        process = subprocess.Popen(
-            cmd,
-            stdout=open(LOG_FILE, "a", encoding="utf-8"),
-            stderr=subprocess.STDOUT,
-        )
+        with open(OUTPUT_FILE, "w", encoding="utf-8") as output:
+            process = subprocess.Popen(
+                cmd,
+                stdout=output,
+                stderr=subprocess.STDOUT,
+                env={**os.environ, "SCRAPER_CONCURRENCY": str(concurrency), "SCRAPER_PARSE_WORKERS": str(parse_workers),
+                     "SCRAPER_LOG_LEVEL": "DEBUG" if verbose_logs else "INFO", "SCRAPER_LOG_ECHO": "0"},
+            )
 
         st.session_state.process = process
         st.session_state.running = True
-        st.session_state.logs = read_logs()
         st.rerun()
 
 # --- STOP Action ---
@@ -116,23 +206,72 @@ if stop_clicked:
     else:
         st.warning("Not running.")
 
-# --- Logs View ---
-st.subheader("📝 Live Logs")
-st.session_state.logs = read_logs()
-st.text_area("Logs", st.session_state.logs, height=500)
-
-# --- Auto Check Status ---
-if st.session_state.running and st.session_state.process:
-    retcode = st.session_state.process.poll()
-    if retcode is not None:
-        st.session_state.running = False
-        if os.path.exists(LOCK_FILE):
-            os.remove(LOCK_FILE)
-        
-        if retcode == 0:
-            st.success("✅ Job Finished Successfully!")
-        else:
-            st.error(f"❌ Job Failed (Code {retcode})")
-        
-        st.session_state.process = None
-        st.rerun()
\ No newline at end of file
+@st.fragment(run_every=refresh_rate)
+def dashboard():
+    # --- Progress View (scraper_progress.json, published by the updater) ---
+    st.subheader("📊 Progress")
+    progress = read_progress()
+    jobs_progress = read_job_progress()
+    if progress:
+        total, done = progress["total"], progress["done"]
+        window = f"{progress['window']}/{progress['windows']}" if progress["windows"] > 1 else "-"
+        if progress["window_rows"]:
+            window += f" (rows {progress['first_row']}–{progress['last_row']})"
+        st.progress(min(done / total, 1.0) if total else 1.0,
+                    text=f"{progress['status']}: {done}/{total} rows, window {window}")
+        m1, m2, m3, m4, m5 = st.columns(5)
+        m1.metric("Rows done", f"{done}/{total}")
+        m2.metric("Failed", progress["failed"] - progress["recovered"],
+                  help=f"{progress['failed']} failed the first pass, {progress['recovered']} recovered on retry")
+        m3.metric("Rows written", progress["written"])
+        m4.metric("Rows/min", progress["rows_per_min"])
+        m5.metric("ETA", format_seconds(progress["eta_s"]), help=f"elapsed {format_seconds(progress['elapsed_s'])}")
+
+        c1, c2 = st.columns(2)
+        if progress["history"]:
+            c1.caption("Rows done / rows per minute")
+            c1.line_chart(progress["history"], x="elapsed_s", y=["done", "rows_per_min"], height=250)
+        if progress["stages"]:
+            c2.caption("Stage latency (seconds, p50 / p95)")
+            stages = [{"stage": stage, "p50": s["p50"], "p95": s["p95"]} for stage, s in progress["stages"].items()]
+            c2.bar_chart(stages, x="stage", y=["p50", "p95"], stack=False, height=250)
+    elif not jobs_progress:
+        st.info("No progress yet.")
+
+    # --- Per-job progress (job_runner.py, one scraper_progress.<job>.json per job) ---
+    for name, job in jobs_progress.items():
+        total, done = job["total"], job["done"]
+        st.progress(min(done / total, 1.0) if total else 1.0,
+                    text=f"{name} — {job['status']}: {done}/{total} rows, "
+                         f"{job['failed'] - job['recovered']} failed, {job['written']} written, "
+                         f"{job['rows_per_min']} rows/min, ETA {format_seconds(job['eta_s'])}")
+
+    # --- Logs View ---
+    st.subheader("📝 Live Logs")
+    tail_logs()
+    st.text_area("Logs", st.session_state.logs or "No logs yet.", height=500)
+    if os.path.exists(OUTPUT_FILE) and os.path.getsize(OUTPUT_FILE):
+        with st.expander("Process output (diagnostics, errors)"):
+            with open(OUTPUT_FILE, "rb") as f:
+                f.seek(max(0, os.path.getsize(OUTPUT_FILE) - LOG_TAIL_CHARS))
+                st.code(f.read().decode("utf-8", errors="replace"), language=None)
+
+    # --- Auto Check Status ---
+    if st.session_state.running and st.session_state.process:
+        retcode = st.session_state.process.poll()
+        if retcode is not None:
+            st.session_state.running = False
+            if os.path.exists(LOCK_FILE):
+                os.remove(LOCK_FILE)
+
+            if retcode == 0:
+                st.success("✅ Job Finished Successfully!")
+            else:
+                st.error(f"❌ Job Failed (Code {retcode})")
+
+            st.session_state.process = None
+            # Full rerun, re-enables Start in the sidebar
+            st.rerun()
+
+
+dashboard()
\ No newline at end of file
@@ -0,0 +1,58 @@
+import os
+import threading
+
+# requests / aiohttp are imported by the function that builds their session,
+# each entry point only pays for the client it actually uses.
+
+# --- CONFIGURATION ---
+# Separate connect / read timeouts instead of one flat timeout=100:
+# a dead proxy fails fast, a slow render still gets its full read window.
+CONNECT_TIMEOUT = float(os.environ.get("SCRAPER_CONNECT_TIMEOUT", 10))
+READ_TIMEOUT = float(os.environ.get("SCRAPER_READ_TIMEOUT", 100))
+DEFAULT_POOL_SIZE = 20
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size=DEFAULT_POOL_SIZE):
+    """
+    Shared requests.Session for the sync code paths (scraper.py).
+    Keep-alive connections to the proxy API are reused across calls and threads,
+    the pool is sized to the worker count so no thread waits for a socket
+    (pool_block=True): pass it on the first call, which creates the session.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_size), pool_block=True)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers["Accept-Encoding"] = accept_encoding()
+                _session = session
+    return _session
+
+
+def accept_encoding():
+    """gzip/deflate always, br as well when the brotli package is installed."""
+    from urllib3.util import make_headers
+    return make_headers(accept_encoding=True)["accept-encoding"]
+
+
+def request_timeout():
+    """(connect, read) tuple for requests."""
+    return CONNECT_TIMEOUT, READ_TIMEOUT
+
+
+def make_async_session(pool_size=DEFAULT_POOL_SIZE):
+    """aiohttp session for the async fetch engine, same pool sizing / timeouts / encodings."""
+    import aiohttp
+    return aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT),
+        connector=aiohttp.TCPConnector(limit=max(1, pool_size), keepalive_timeout=60, ttl_dns_cache=300),
+        headers={"Accept-Encoding": accept_encoding()},
+    )
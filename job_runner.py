@@ -0,0 +1,154 @@
+import asyncio
+import json
+import os
+import re
+import signal
+import sys
+
+from progress import job_progress_file
+from run_journal import job_journal_file
+import walmart_sheet_updater as updater
+from walmart_sheet_updater import SharedPool, UpdateJob, StopRequested, on_sigterm, parse_args, tagged_log, log
+
+# --- CONFIGURATION ---
+JOBS_FILE = os.environ.get("SCRAPER_JOBS_FILE", "jobs.json")
+# Window for jobs that set no --window=: the rows of a window are all queued on the shared
+# engine at once, smaller windows let the jobs take turns instead of the first one going first
+RUNNER_WINDOW_ROWS = int(os.environ.get("SCRAPER_RUNNER_WINDOW_ROWS", 500))
+RUN_WIDE_FLAGS = ("--no-cache", "--no-fingerprints", "--metrics-port=")
+
+_SPREADSHEET_ID = re.compile(r"/spreadsheets/d/([A-Za-z0-9_-]+)")
+
+
+def spreadsheet_id(url):
+    """Spreadsheet ID of a sheet URL (the tabs of one spreadsheet share its write quota)."""
+    m = _SPREADSHEET_ID.search(url)
+    return m.group(1) if m else url
+
+
+def load_jobs(path=JOBS_FILE):
+    """
+    Job specs from a JSON list, each gets a unique file-safe "name" (default job1, job2, ...):
+
+        [
+          {"name": "home", "sheet": "https://docs.google.com/spreadsheets/d/<id>/edit", "tab": "Walmart",
+           "args": ["2", "5000", "--priority"]},
+          {"name": "toys", "sheet": "https://docs.google.com/spreadsheets/d/<id2>/edit", "args": ["list", "3,5,10"]}
+        ]
+
+    "args" are walmart_sheet_updater arguments (rows + per-job flags), "tab" a
+    worksheet title or 0-based index (default: the first tab).
+    """
+    with open(path, encoding="utf-8") as f:
+        specs = json.load(f)
+    if not isinstance(specs, list) or not specs:
+        raise ValueError(f"{path} must hold a non-empty JSON list of jobs")
+    names = set()
+    for n, spec in enumerate(specs, 1):
+        if not spec.get("sheet"):
+            raise ValueError(f"Job {n} in {path} has no \"sheet\" URL")
+        name = re.sub(r"[^A-Za-z0-9_-]+", "_", str(spec.get("name") or f"job{n}"))
+        if name in names:
+            raise ValueError(f"Duplicate job name '{name}' in {path}")
+        names.add(name)
+        spec["name"] = name
+    return specs
+
+
+def open_worksheet(spec):
+    spreadsheet = updater.get_client().open_by_url(spec["sheet"])
+    tab = spec.get("tab")
+    if tab is None or isinstance(tab, int):
+        return spreadsheet.get_worksheet(tab or 0)
+    return spreadsheet.worksheet(tab)
+
+
+def job_options(spec, extra_args):
+    options = parse_args(list(spec.get("args", [])) + extra_args)
+    if not any(a.startswith("--window=") for a in list(spec.get("args", [])) + extra_args):
+        options.window_rows = RUNNER_WINDOW_ROWS
+    return options
+
+
+def run_jobs(specs, argv=(), api_key=None, open_sheet=open_worksheet):
+    """
+    Runs `specs` (see load_jobs) concurrently on one SharedPool. `argv` are the
+    command line flags, `open_sheet(spec)` returns the spec's worksheet.
+    Returns {job name: "done" | "stopped" | "failed"}.
+    """
+    run_wide = [a for a in argv if a.startswith(RUN_WIDE_FLAGS)]
+    extra_args = [a for a in argv if a not in run_wide]
+    options = parse_args(run_wide)
+    api_key = api_key or updater.get_secrets()["api_keys"]["scraper_do"]
+
+    pool = SharedPool(api_key, use_cache=options.use_cache, use_fingerprints=options.use_fingerprints,
+                      metrics_port=options.metrics_port)
+    jobs = {}
+    statuses = {}
+    try:
+        for spec in specs:
+            name = spec["name"]
+            try:
+                tab = f"#{spec['tab']}" if spec.get("tab") is not None else ""
+                jobs[name] = UpdateJob(job_options(spec, extra_args), pool, open_sheet(spec),
+                                       sheet_url=spec["sheet"] + tab, spreadsheet=spreadsheet_id(spec["sheet"]),
+                                       name=name, journal_path=job_journal_file(name),
+                                       progress_path=job_progress_file(name)).start()
+            except Exception as e:
+                # A bad sheet / tab / header only costs its own job
+                tagged_log(name)(f"❌ Could not start job: {e}", "ERROR")
+                statuses[name] = "failed"
+        if jobs:
+            log(f"🚚 {len(jobs)} jobs: " + ", ".join(f"{name} ({len(job.target_rows)} rows)"
+                                                   for name, job in jobs.items()))
+
+        signal.signal(signal.SIGTERM, on_sigterm)
+        status = None
+        try:
+            asyncio.run(pool.run(list(jobs.values())))
+        except StopRequested:
+            status = "stopped"
+            raise
+        except BaseException:
+            status = "failed"
+            raise
+        finally:
+            for name, job in jobs.items():
+                statuses[name] = job.finish(status)
+    finally:
+        pool.close()
+        if statuses:
+            log("🏁 " + ", ".join(f"{spec['name']}: {statuses[spec['name']]}" for spec in specs
+                                 if spec["name"] in statuses))
+    return statuses
+
+
+def main(argv=None):
+    """
+    python job_runner.py [jobs.json] [--no-cache] [--no-fingerprints] [--metrics-port=N] [--resume] ...
+
+    Runs every job of the file in this process: one scrape.do budget for the
+    whole fleet, Sheets writes paced per spreadsheet, a journal and progress
+    file per job. --no-cache / --no-fingerprints / --metrics-port are run-wide
+    (the cache, fingerprints and metrics are shared), any other flag is added
+    to every job.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    paths = [a for a in argv if not a.startswith("--")]
+    # Clear old logs if running new session
+    open(updater.LOG_FILE, "w").close()
+    log(" Walmart job runner started...")
+    try:
+        statuses = run_jobs(load_jobs(paths[0] if paths else JOBS_FILE), [a for a in argv if a.startswith("--")])
+        return 0 if all(status == "done" for status in statuses.values()) else 1
+    except Exception as e:
+        log(f" Fatal error: {e}", "ERROR")
+        return 1
+    finally:
+        if os.path.exists("start.txt"):
+            os.remove("start.txt")
+        updater.get_run_log().close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
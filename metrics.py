@@ -0,0 +1,156 @@
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# --- CONFIGURATION ---
+# JSON-lines file with one event per timing plus a final summary, "" = no file
+METRICS_FILE = os.environ.get("SCRAPER_METRICS_FILE", "scraper_metrics.jsonl")
+# Prometheus-style text endpoint on http://127.0.0.1:<port>/metrics, 0 = off
+METRICS_PORT = int(os.environ.get("SCRAPER_METRICS_PORT", 0))
+# Samples kept per stage for the percentiles, reservoir-sampled beyond that
+MAX_SAMPLES = 10000
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list, None if empty."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+class Metrics:
+    """
+    Per-stage timings and counters of one run, shared by every component
+    (fetch engine, parse stage, Sheets writer) the same way `log` is.
+
+        metrics.observe("fetch", 0.42, status=200)
+        with metrics.time("parse"):
+            ...
+        metrics.count("fetch_retry")
+
+    Every timing is appended to `path` as a JSON line as it happens, close()
+    adds a summary line (count / sum / p50 / p95 / max per stage, counters
+    and their per-minute rates). serve() exposes the same numbers in the
+    Prometheus text format while the run is going.
+    """
+
+    def __init__(self, path=METRICS_FILE, port=METRICS_PORT):
+        self.started = time.monotonic()
+        self.port = port
+        self._stages = {}    # stage -> {"count", "sum", "max", "samples"}
+        self._counters = {}  # (name, ((label, value), ...)) -> n
+        self._lock = threading.Lock()
+        self._file = open(path, "w", encoding="utf-8") if path else None
+        self._server = None
+
+    def observe(self, stage, seconds, **labels):
+        with self._lock:
+            entry = self._stages.setdefault(stage, {"count": 0, "sum": 0.0, "max": 0.0, "samples": []})
+            entry["count"] += 1
+            entry["sum"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+            if len(entry["samples"]) < MAX_SAMPLES:
+                entry["samples"].append(seconds)
+            else:
+                slot = random.randrange(entry["count"])
+                if slot < MAX_SAMPLES:
+                    entry["samples"][slot] = seconds
+            if self._file:
+                event = {"ts": round(time.time(), 3), "stage": stage, "seconds": round(seconds, 4)}
+                event.update(labels)
+                self._file.write(json.dumps(event) + "\n")
+
+    @contextmanager
+    def time(self, stage, **labels):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.monotonic() - started, **labels)
+
+    def count(self, name, n=1, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def summary(self):
+        elapsed_min = max(time.monotonic() - self.started, 1e-9) / 60
+        with self._lock:
+            stages = {}
+            for stage, entry in self._stages.items():
+                samples = sorted(entry["samples"])
+                stages[stage] = {
+                    "count": entry["count"], "sum": round(entry["sum"], 3), "max": round(entry["max"], 4),
+                    "p50": round(percentile(samples, 0.50), 4), "p95": round(percentile(samples, 0.95), 4),
+                }
+            counters = [
+                {"name": name, **dict(labels), "value": n, "per_min": round(n / elapsed_min, 2)}
+                for (name, labels), n in sorted(self._counters.items())
+            ]
+        return {"elapsed_s": round(elapsed_min * 60, 1), "stages": stages, "counters": counters}
+
+    def summary_lines(self):
+        """Human-readable lines for the run log, slowest stages first."""
+        summary = self.summary()
+        lines = []
+        for stage, s in sorted(summary["stages"].items(), key=lambda item: -item[1]["sum"]):
+            lines.append(f"{stage}: n={s['count']} p50={s['p50']:.3f}s p95={s['p95']:.3f}s "
+                         f"max={s['max']:.3f}s total={s['sum']:.1f}s")
+        for c in summary["counters"]:
+            labels = ",".join(f"{k}={v}" for k, v in c.items() if k not in ("name", "value", "per_min"))
+            lines.append(f"{c['name']}{'{' + labels + '}' if labels else ''}: {c['value']} ({c['per_min']}/min)")
+        return lines
+
+    def prometheus(self):
+        summary = self.summary()
+        out = ["# TYPE scraper_stage_seconds summary"]
+        for stage, s in summary["stages"].items():
+            for q in ("p50", "p95"):
+                out.append(f'scraper_stage_seconds{{stage="{stage}",quantile="0.{q[1:]}"}} {s[q]}')
+            out.append(f'scraper_stage_seconds_sum{{stage="{stage}"}} {s["sum"]}')
+            out.append(f'scraper_stage_seconds_count{{stage="{stage}"}} {s["count"]}')
+        out.append("# TYPE scraper_events_total counter")
+        for c in summary["counters"]:
+            labels = [f'name="{c["name"]}"'] + [f'{k}="{v}"' for k, v in c.items()
+                                                 if k not in ("name", "value", "per_min")]
+            out.append(f'scraper_events_total{{{",".join(labels)}}} {c["value"]}')
+        out.append(f"scraper_elapsed_seconds {summary['elapsed_s']}")
+        return "\n".join(out) + "\n"
+
+    def serve(self):
+        """Starts the /metrics endpoint on `port` (if set) in a daemon thread."""
+        if not self.port:
+            return self
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus().encode()
+                self.send_response(200 if self.path.startswith("/metrics") else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        return self
+
+    def close(self):
+        if self._file:
+            summary = self.summary()
+            with self._lock:
+                self._file.write(json.dumps({"ts": round(time.time(), 3), "summary": summary}) + "\n")
+                self._file.close()
+                self._file = None
+        if self._server:
+            self._server.shutdown()
+            self._server = None
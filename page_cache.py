@@ -0,0 +1,201 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+# --- CONFIGURATION ---
+CACHE_FILE = os.environ.get("SCRAPE_CACHE_FILE", "scrape_cache.sqlite3")
+CACHE_TTL_HOURS = float(os.environ.get("SCRAPE_CACHE_TTL_HOURS", 6))
+CACHE_MAX_MB = float(os.environ.get("SCRAPE_CACHE_MAX_MB", 500))
+# Content fingerprints outlive the page TTL, a product unchanged for weeks keeps skipping its parse
+FINGERPRINT_TTL_DAYS = float(os.environ.get("SCRAPE_FINGERPRINT_TTL_DAYS", 30))
+
+# Query params that never change the page content
+_TRACKING_PARAMS = {"athbdg", "athcpid", "athpgid", "athznid", "athieid", "athstid",
+                    "athguid", "athancid", "athena", "from", "ref", "ref_", "psc", "gclid", "fbclid"}
+
+
+def normalize_url(url):
+    """Cache key for a product URL: lowercase host, no fragment, no tracking params, sorted query."""
+    parts = urllib.parse.urlsplit(url.strip())
+    query = [
+        (k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in _TRACKING_PARAMS and not k.lower().startswith("utm_")
+    ]
+    path = parts.path.rstrip("/") or "/"
+    return urllib.parse.urlunsplit((
+        (parts.scheme or "https").lower(),
+        parts.netloc.lower(),
+        path,
+        urllib.parse.urlencode(sorted(query)),
+        "",
+    ))
+
+
+# Canonical item IDs, so every URL variant of one product shares a key. Amazon / eBay keep
+# their marketplace domain: amazon.com and amazon.co.uk list the same ASIN at different prices
+_ITEM_ID_PATTERNS = [
+    (re.compile(r"(walmart)\.com/ip/(?:[^?#]*/)?(\d+)(?:[/?#]|$)", re.IGNORECASE)),
+    (re.compile(r"(amazon\.[^/?#:]+)/(?:.*/)?(?:dp|gp/product)/([A-Z0-9]{10})", re.IGNORECASE)),
+    (re.compile(r"(ebay\.[^/?#:]+)/itm/(?:[^/?#]+/)?(\d+)", re.IGNORECASE)),
+]
+
+
+def product_key(url):
+    """
+    'walmart:123456' for /ip/<slug>/123456, 'amazon.co.uk:B000123456' / 'ebay.de:123456'
+    for Amazon ASINs / eBay items, else the normalized URL.
+    """
+    for pattern in _ITEM_ID_PATTERNS:
+        m = pattern.search(url)
+        if m:
+            return f"{m.group(1).lower()}:{m.group(2).upper()}"
+    return normalize_url(url)
+
+
+class PageCache:
+    """
+    On-disk SQLite cache of the parsed result of fetched pages, keyed by
+    (product_key(url), parser name) so the Walmart updater and the multi-marketplace
+    scraper can share one file without mixing result formats.
+
+    Only pages that parsed successfully are stored, a retry never gets a cached miss.
+    Entries older than `ttl_hours` are ignored, and the oldest entries are evicted
+    once the cache grows past `max_mb`.
+    """
+
+    EVICT_EVERY = 50  # puts between size checks
+
+    def __init__(self, path=CACHE_FILE, ttl_hours=CACHE_TTL_HOURS, max_mb=CACHE_MAX_MB):
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT NOT NULL,
+                parser TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                html BLOB,  -- no longer stored (nothing read it), kept for existing cache files
+                result TEXT,
+                size INTEGER NOT NULL,
+                PRIMARY KEY (url, parser)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_fetched_at ON pages (fetched_at)")
+        self._conn.commit()
+
+    def get(self, url, parser):
+        """Returns the cached parsed result (a list) if fresh enough, else None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fetched_at, result FROM pages WHERE url = ? AND parser = ?",
+                (product_key(url), parser),
+            ).fetchone()
+        if not row or time.time() - row[0] > self.ttl_seconds or row[1] is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[1])
+
+    def put(self, url, parser, result):
+        """Blocking SQLite write + commit, async callers run it off the event loop (asyncio.to_thread)."""
+        result_json = json.dumps(list(result))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, parser, fetched_at, html, result, size) VALUES (?, ?, ?, NULL, ?, ?)",
+                (product_key(url), parser, time.time(), result_json, len(result_json)),
+            )
+            self._conn.commit()
+            self._puts += 1
+            if self._puts % self.EVICT_EVERY == 0:
+                self._evict()
+
+    def _evict(self):
+        # Drop expired rows, then the oldest rows until we are under the size budget
+        self._conn.execute("DELETE FROM pages WHERE fetched_at < ?", (time.time() - self.ttl_seconds,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total > self.max_bytes:
+            excess = total - self.max_bytes
+            rows = self._conn.execute("SELECT url, parser, size FROM pages ORDER BY fetched_at").fetchall()
+            doomed = []
+            for url, parser, size in rows:
+                if excess <= 0:
+                    break
+                doomed.append((url, parser))
+                excess -= size
+            self._conn.executemany("DELETE FROM pages WHERE url = ? AND parser = ?", doomed)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._evict()
+            self._conn.close()
+
+
+class FingerprintStore:
+    """
+    Last content fingerprint and parsed result per (product_key(url), parser), in
+    its own table of the page cache file. A freshly fetched page whose fingerprint
+    matches the stored one gets the stored result back instead of being parsed.
+
+    Unlike PageCache entries these are not tied to the page TTL: only the small
+    result is kept, and rows not refreshed for `ttl_days` are dropped on close().
+    """
+
+    def __init__(self, path=CACHE_FILE, ttl_days=FINGERPRINT_TTL_DAYS):
+        self.path = path
+        self.ttl_seconds = ttl_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # One row per fetched product, no fsync per commit (a lost row only costs one parse)
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                url TEXT NOT NULL,
+                parser TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                result TEXT NOT NULL,
+                seen_at REAL NOT NULL,
+                PRIMARY KEY (url, parser)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, url, parser, fingerprint):
+        """Returns the stored result (a list) if `fingerprint` matches the stored one, else None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, result, seen_at FROM fingerprints WHERE url = ? AND parser = ?",
+                (product_key(url), parser),
+            ).fetchone()
+        if not row or row[0] != fingerprint or time.time() - row[2] > self.ttl_seconds:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[1])
+
+    def put(self, url, parser, fingerprint, result):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fingerprints (url, parser, fingerprint, result, seen_at) VALUES (?, ?, ?, ?, ?)",
+                (product_key(url), parser, fingerprint, json.dumps(list(result)), time.time()),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM fingerprints WHERE seen_at < ?", (time.time() - self.ttl_seconds,))
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,82 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# --- CONFIGURATION ---
+# Parse processes (CPU stage), separate from the fetch concurrency (network stage)
+PARSE_WORKERS = int(os.environ.get("SCRAPER_PARSE_WORKERS", os.cpu_count() or 1))
+PARSE_START_METHOD = os.environ.get("SCRAPER_PARSE_START_METHOD", "spawn")
+
+
+def _timed_call(fn, *args):
+    """Runs in the worker: `fn`'s result and its duration, without the queue wait / transfer."""
+    started = time.monotonic()
+    result = fn(*args)
+    return result, time.monotonic() - started
+
+
+class ParseStage:
+    """
+    CPU stage of the scrape pipeline, backed by a ProcessPoolExecutor.
+
+    Fetch workers hand raw HTML to run()/run_async() and get the small result
+    tuple back, so parsing uses every core instead of queueing behind the GIL.
+    `fn` must be a module-level function (it is pickled to the worker), and the
+    entry script must keep its work under `if __name__ == "__main__"`: the
+    workers are spawned and import it.
+    workers=0 parses inline, which is handy for debugging and tiny runs.
+
+    With `metrics`, every call records "parse" (the time spent in `fn`, timed
+    in the worker) and "parse_wait" (queueing for a worker + pickling the HTML
+    and the result).
+    """
+
+    def __init__(self, workers=PARSE_WORKERS, metrics=None):
+        self.workers = max(0, int(workers))
+        self.metrics = metrics
+        self._pool = None
+        if self.workers > 0:
+            # Not fork: the workers start once the log / writer / metrics threads run, a forked
+            # child could inherit one of their locks held and hang on its first print()
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context(PARSE_START_METHOD))
+
+    def run(self, fn, *args):
+        if self.metrics is None:
+            return fn(*args) if self._pool is None else self._pool.submit(fn, *args).result()
+        started = time.monotonic()
+        if self._pool is None:
+            result = _timed_call(fn, *args)
+        else:
+            result = self._pool.submit(_timed_call, fn, *args).result()
+        return self._observe(started, *result)
+
+    async def run_async(self, fn, *args):
+        if self.metrics is None:
+            if self._pool is None:
+                return await asyncio.to_thread(fn, *args)
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        started = time.monotonic()
+        if self._pool is None:
+            result = await asyncio.to_thread(_timed_call, fn, *args)
+        else:
+            result = await asyncio.get_running_loop().run_in_executor(self._pool, _timed_call, fn, *args)
+        return self._observe(started, *result)
+
+    def _observe(self, started, result, seconds):
+        self.metrics.observe("parse", seconds)
+        self.metrics.observe("parse_wait", max(0.0, time.monotonic() - started - seconds))
+        return result
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
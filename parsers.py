@@ -0,0 +1,442 @@
+import hashlib
+import json
+import os
+import re
+from typing import Any, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from bs4 import BeautifulSoup
+import lxml.etree
+import lxml.html
+
+from run_log import enabled
+
+# --- CONFIGURATION ---
+# "json"  : read the __NEXT_DATA__ blob, fall back to "lxml" when it is not conclusive (default)
+# "lxml"  : the soup selectors evaluated as XPath on an lxml tree
+# "soup"  : original BeautifulSoup(html.parser) implementation
+WALMART_PARSER_ENGINE = os.environ.get("WALMART_PARSER_ENGINE", "json")
+# Stock-detection diagnostics ("Fulfillment tag text: ..."), printed only with SCRAPER_LOG_LEVEL=DEBUG
+DIAGNOSTICS = enabled("DEBUG")
+
+LOW_STOCK_CLASS = "w_yTSq f7 f6-hdkp lh-solid lh-title-hdkp b dark-red w_0aYG w_MwbK"
+UNAVAILABLE_CLASS = "b mr1"
+
+_DIGITS_RE = re.compile(r"(\d+)")
+_PRICE_RE = re.compile(r"\$?([\d.,]+)")
+_SELLER_SUFFIX_RE = re.compile(r'\.com.*$')
+_FULFILLMENT_RE = re.compile(r'fulfillment-shipping-intent', re.IGNORECASE)
+
+# Precompiled XPath for the lxml engine
+_XP_SELLER = lxml.etree.XPath('//span[@data-testid="product-seller-info"]')
+_XP_SELLER_LINK = lxml.etree.XPath('.//a[@data-testid="seller-name-link"]')
+_XP_LOW_STOCK = lxml.etree.XPath(f'//span[@class="{LOW_STOCK_CLASS}"]')
+_XP_UNAVAILABLE = lxml.etree.XPath(f'//span[@class="{UNAVAILABLE_CLASS}"]')
+_XP_FULFILLMENT = lxml.etree.XPath(
+    '//div[contains(translate(@data-seo-id, "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"),'
+    ' "fulfillment-shipping-intent")]'
+)
+_XP_PRICE = lxml.etree.XPath('//span[@itemprop="price"][@data-seo-id="hero-price"]')
+
+
+# Amazon / eBay selectors, compiled once at import
+AMAZON_CANNOT_SHIP_TEXT = ("This item cannot be shipped to your selected delivery location. "
+                           "Please choose a different delivery location.")
+AMAZON_PRICE_CLASS = "a-price aok-align-center reinventPricePriceToPayMargin priceToPay"
+
+
+def _has_class(name):
+    # bs4 class_="x" semantics: "x" is one of the element's classes
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+_XP_AMAZON_AVAILABILITY = lxml.etree.XPath('//div[@id="availability"]')
+_XP_AMAZON_PRICE = lxml.etree.XPath(f'//span[@class="{AMAZON_PRICE_CLASS}"]')
+_XP_AMAZON_PRICE_WHOLE = lxml.etree.XPath(f'.//span[{_has_class("a-price-whole")}]')
+_XP_AMAZON_PRICE_FRACTION = lxml.etree.XPath(f'.//span[{_has_class("a-price-fraction")}]')
+_XP_EBAY_PRICE = lxml.etree.XPath(f'//div[{_has_class("x-price-primary")}][@data-testid="x-price-primary"]')
+_XP_EBAY_QTY = lxml.etree.XPath('//div[@id="qtyAvailability"]')
+_XP_EBAY_TEXTSPANS = lxml.etree.XPath(f'.//span[{_has_class("ux-textspans")}]')
+_EBAY_PRICE_JUNK_RE = re.compile(r'US|\$|/ea|,')
+
+
+# --- Shared result type ---
+class ProductInfo(NamedTuple):
+    """What every marketplace parser returns, each entry point writes the fields it needs."""
+    price: Optional[float] = None
+    in_stock: bool = False
+    stock: Any = 0                  # Walmart stock status: 0, 100 or the low-stock count
+    seller: str = ""
+    available_qty: Optional[str] = None
+    sold_qty: Optional[str] = None
+    cannot_ship: bool = False
+    error: bool = False             # not a product page / parser failure
+    failure: Optional[str] = None   # retry_policy class that made the scraper give up on the page
+
+
+# --- Parser registry: hostname -> parse(html) returning ProductInfo ---
+PARSERS = {}
+# Brand label -> parse, for marketplaces on a domain not listed in PARSERS (amazon.nl, ebay.ie, ...)
+BRAND_PARSERS = {}
+
+
+def register(*hosts, brand=None):
+    def add(parse):
+        for host in hosts:
+            PARSERS[host] = parse
+        if brand:
+            BRAND_PARSERS[brand] = parse
+        return parse
+    return add
+
+
+def parser_for(url):
+    """
+    Parser registered for the URL's host or a parent domain (www.amazon.co.uk -> amazon.co.uk),
+    else for a brand label followed by any TLD (www.amazon.com.br -> "amazon"), or None.
+    """
+    parts = (urlsplit(url).hostname or "").split(".")
+    for i in range(len(parts) - 1):
+        parse = PARSERS.get(".".join(parts[i:]))
+        if parse:
+            return parse
+    for label in parts[:-1]:
+        parse = BRAND_PARSERS.get(label)
+        if parse:
+            return parse
+    return None
+
+
+def _clean_seller(seller_name):
+    return _SELLER_SUFFIX_RE.sub('', seller_name).strip()
+
+
+def _parse_price(price_text):
+    m = _PRICE_RE.search(price_text)
+    if m:
+        return round(float(m.group(1).replace(',', '')), 2)
+    return None
+
+
+# --- Engine: BeautifulSoup (reference implementation) ---
+def parse_walmart_soup(html):
+    soup = BeautifulSoup(html, "html.parser")
+
+    # Seller
+    seller_tag = soup.find("span", attrs={"data-testid": "product-seller-info"})
+    seller_name = ""
+    if seller_tag:
+        link_tag = seller_tag.find("a", attrs={"data-testid": "seller-name-link"})
+        if link_tag:
+            seller_name = link_tag.get_text(strip=True)
+        else:
+            seller_name = seller_tag.get_text(strip=True).replace("Sold and shipped by", "").strip()
+        seller_name = _clean_seller(seller_name)
+
+    # Stock
+    stock_status = 0
+    low_stock_span = soup.find("span", class_=LOW_STOCK_CLASS)
+    if low_stock_span:
+        span_text = low_stock_span.get_text(strip=True)
+        match = _DIGITS_RE.search(span_text)
+        if match:
+            stock_status = match.group(1)
+        else:
+            stock_status = "10"
+    else:
+        unavailable_tag = soup.find("span", class_=UNAVAILABLE_CLASS)
+        # 1. Primary Check: Look at the unavailable_tag first
+        if unavailable_tag:
+            unavailable_text = unavailable_tag.get_text().strip()
+
+            # Case A: Explicit "Out of stock" -> Immediate 0
+            if "Out of stock" in unavailable_text:
+                stock_status = 0
+                if DIAGNOSTICS:
+                    print(f"    ↳ Detected 'Out of stock' directly.")
+            # Case B: "Not available" -> Dig deeper into fulfillment tag
+            elif "Not available" in unavailable_text:
+                if DIAGNOSTICS:
+                    print(f"    ↳ Detected 'Not available', checking fulfillment tag...")
+                # Look for the fulfillment tag (case-insensitive for 'shipping')
+                fulfillment_tag = soup.find('div', attrs={'data-seo-id': _FULFILLMENT_RE})
+                if fulfillment_tag:
+                    tag_text = fulfillment_tag.get_text().strip()
+                    if DIAGNOSTICS:
+                        print(f"      ↳ Fulfillment tag text: {tag_text}")
+                    # Sub-check 1: Still says out of stock
+                    if "Out of stock" in tag_text:
+                        stock_status = 0
+                        if DIAGNOSTICS:
+                            print(f"      ↳ Detected 'Out of stock' in fulfillment tag.")
+                    # Sub-check 2: Says "Arrives [Date]" -> In Stock
+                    elif "Arrives" in tag_text:
+                        stock_status = 100
+                        if DIAGNOSTICS:
+                            print(f"      ↳ Detected 'Arrives' in fulfillment tag, marking as in stock.")
+        else:
+            stock_status = 100 if seller_tag else 0
+
+    # Price
+    price = None
+    price_tag = soup.find("span", attrs={"itemprop": "price", "data-seo-id": "hero-price"})
+    if price_tag:
+        price = _parse_price(price_tag.text.strip())
+
+    return price, stock_status, seller_name
+
+
+# --- Engine: lxml (same selectors, C parser + precompiled XPath) ---
+def _text(el, strip_parts=False):
+    if strip_parts:
+        # Same as bs4 get_text(strip=True)
+        return "".join(part.strip() for part in el.itertext())
+    return "".join(el.itertext())
+
+
+def parse_walmart_lxml(html):
+    tree = lxml.html.fromstring(html)
+
+    # Seller
+    seller_tags = _XP_SELLER(tree)
+    seller_tag = seller_tags[0] if seller_tags else None
+    seller_name = ""
+    if seller_tag is not None:
+        link_tags = _XP_SELLER_LINK(seller_tag)
+        if link_tags:
+            seller_name = _text(link_tags[0], strip_parts=True)
+        else:
+            seller_name = _text(seller_tag, strip_parts=True).replace("Sold and shipped by", "").strip()
+        seller_name = _clean_seller(seller_name)
+
+    # Stock
+    stock_status = 0
+    low_stock = _XP_LOW_STOCK(tree)
+    if low_stock:
+        match = _DIGITS_RE.search(_text(low_stock[0], strip_parts=True))
+        stock_status = match.group(1) if match else "10"
+    else:
+        unavailable = _XP_UNAVAILABLE(tree)
+        if unavailable:
+            unavailable_text = _text(unavailable[0]).strip()
+            if "Out of stock" in unavailable_text:
+                stock_status = 0
+                if DIAGNOSTICS:
+                    print(f"    ↳ Detected 'Out of stock' directly.")
+            elif "Not available" in unavailable_text:
+                if DIAGNOSTICS:
+                    print(f"    ↳ Detected 'Not available', checking fulfillment tag...")
+                fulfillment = _XP_FULFILLMENT(tree)
+                if fulfillment:
+                    tag_text = _text(fulfillment[0]).strip()
+                    if DIAGNOSTICS:
+                        print(f"      ↳ Fulfillment tag text: {tag_text}")
+                    if "Out of stock" in tag_text:
+                        stock_status = 0
+                        if DIAGNOSTICS:
+                            print(f"      ↳ Detected 'Out of stock' in fulfillment tag.")
+                    elif "Arrives" in tag_text:
+                        stock_status = 100
+                        if DIAGNOSTICS:
+                            print(f"      ↳ Detected 'Arrives' in fulfillment tag, marking as in stock.")
+        else:
+            stock_status = 100 if seller_tag is not None else 0
+
+    # Price
+    price = None
+    price_tags = _XP_PRICE(tree)
+    if price_tags:
+        price = _parse_price(_text(price_tags[0]).strip())
+
+    return price, stock_status, seller_name
+
+
+# --- Engine: __NEXT_DATA__ JSON (no DOM at all for the common in-stock page) ---
+def extract_next_data(html):
+    """Returns the parsed __NEXT_DATA__ blob, or None if the page has none."""
+    marker = html.find('id="__NEXT_DATA__"')
+    if marker == -1:
+        return None
+    start = html.find('>', marker) + 1
+    end = html.find('</script>', start)
+    if start == 0 or end == -1:
+        return None
+    try:
+        return json.loads(html[start:end])
+    except ValueError:
+        return None
+
+
+def _next_data_product(html):
+    data = extract_next_data(html)
+    try:
+        return data["props"]["pageProps"]["initialData"]["data"]["product"]
+    except (TypeError, KeyError):
+        return None
+
+
+def parse_walmart_json(html):
+    """
+    Fast path for the common case: blob present, IN_STOCK, price and seller known,
+    and none of the low-stock / unavailable markers in the page. Anything else is
+    handed to the lxml engine so the result matches the selector logic exactly.
+    """
+    if f'class="{LOW_STOCK_CLASS}"' in html or f'class="{UNAVAILABLE_CLASS}"' in html:
+        return parse_walmart_lxml(html)
+
+    product = _next_data_product(html)
+    if not product or product.get("availabilityStatus") != "IN_STOCK":
+        return parse_walmart_lxml(html)
+
+    try:
+        price = round(float(product["priceInfo"]["currentPrice"]["price"]), 2)
+    except (TypeError, KeyError, ValueError):
+        return parse_walmart_lxml(html)
+
+    seller_name = _clean_seller(product.get("sellerDisplayName") or product.get("sellerName") or "")
+    if not seller_name:
+        return parse_walmart_lxml(html)
+
+    return price, 100, seller_name
+
+
+WALMART_ENGINES = {
+    "json": parse_walmart_json,
+    "lxml": parse_walmart_lxml,
+    "soup": parse_walmart_soup,
+}
+
+
+def parse_walmart_html(html, engine=None):
+    """Returns (price, stock, seller) using the selected engine (default WALMART_PARSER_ENGINE)."""
+    return WALMART_ENGINES[engine or WALMART_PARSER_ENGINE](html)
+
+
+# --- Content fingerprint (skip parsing a page whose relevant parts did not change) ---
+# Bump when a parser change means old fingerprints must not reuse old results
+FINGERPRINT_VERSION = "2"
+FINGERPRINT_WINDOW = 400  # characters hashed after each marker
+# Every spot the engines read: seller, stock and price selectors plus the __NEXT_DATA__ fields
+_FINGERPRINT_MARKERS = (
+    'data-testid="product-seller-info"',
+    f'class="{LOW_STOCK_CLASS}"',
+    f'class="{UNAVAILABLE_CLASS}"',
+    'data-seo-id="hero-price"',
+    "fulfillment-shipping-intent", "Fulfillment-Shipping-Intent",  # the lxml / soup match is case-insensitive
+    '"availabilityStatus"', '"currentPrice"', '"sellerDisplayName"', '"sellerName"',
+)
+
+
+def walmart_fingerprint(html):
+    """
+    Hash of the page regions the Walmart engines look at, found with plain
+    str.find (no regex, no DOM). Pages with the same fingerprint parse to the
+    same (price, stock, seller), so a stored result can be reused. It errs on
+    the side of changing: every occurrence of a marker is hashed, including
+    ones the parsers would not pick.
+    """
+    digest = hashlib.blake2b(FINGERPRINT_VERSION.encode(), digest_size=16)
+    for marker in _FINGERPRINT_MARKERS:
+        pos = html.find(marker)
+        while pos != -1:
+            digest.update(html[pos:pos + FINGERPRINT_WINDOW].encode())
+            pos = html.find(marker, pos + len(marker))
+    return digest.hexdigest()
+
+
+# Present on any product page, including unavailable / out-of-stock ones with no seller or price
+_PRODUCT_MARKERS = (
+    'data-testid="product-seller-info"',
+    f'class="{UNAVAILABLE_CLASS}"',
+    'data-seo-id="hero-price"',
+)
+
+
+def is_walmart_product_page(html):
+    """False for captcha / error / empty pages: none of the product selectors nor a __NEXT_DATA__ product."""
+    return any(marker in html for marker in _PRODUCT_MARKERS) or _next_data_product(html) is not None
+
+
+@register("walmart.com")
+def parse_walmart(html, engine=None):
+    if not html or not html.strip():
+        return ProductInfo(error=True)
+    try:
+        price, stock, seller = parse_walmart_html(html, engine)
+    except Exception as e:
+        # e.g. lxml "Document is empty" on a comment-only body
+        print(f"Error parsing Walmart HTML: {e}")
+        return ProductInfo(error=True)
+    return ProductInfo(price=price, in_stock=stock not in (0, "0"), stock=stock, seller=seller,
+                       error=price is None and not seller and not is_walmart_product_page(html))
+
+
+# --- Amazon ---
+@register("amazon.com", "amazon.ca", "amazon.com.mx", "amazon.co.uk", "amazon.de", "amazon.fr", "amazon.it",
+          "amazon.es", "amazon.com.au", "amazon.in", "amazon.co.jp", brand="amazon")
+def parse_amazon(html):
+    try:
+        tree = lxml.html.fromstring(html)
+
+        # Check for delivery restriction message
+        availability = _XP_AMAZON_AVAILABILITY(tree)
+        availability_text = _text(availability[0], strip_parts=True) if availability else ""
+        if AMAZON_CANNOT_SHIP_TEXT in availability_text:
+            return ProductInfo(cannot_ship=True)
+
+        # Price: whole part (with its "." span) + fraction
+        price = None
+        price_spans = _XP_AMAZON_PRICE(tree)
+        if price_spans:
+            whole = _XP_AMAZON_PRICE_WHOLE(price_spans[0])
+            fraction = _XP_AMAZON_PRICE_FRACTION(price_spans[0])
+            if whole and fraction:
+                try:
+                    price = float(_text(whole[0], strip_parts=True).replace(',', '')
+                                  + _text(fraction[0], strip_parts=True))
+                except ValueError:
+                    price = None
+
+        in_stock = "In Stock" in availability_text or \
+            ("Only" in availability_text and "left in stock" in availability_text)
+        return ProductInfo(price=price, in_stock=in_stock)
+
+    except Exception as e:
+        print(f"Error parsing Amazon HTML: {e}")
+        return ProductInfo(error=True)
+
+
+# --- eBay ---
+@register("ebay.com", "ebay.ca", "ebay.co.uk", "ebay.de", "ebay.fr", "ebay.it", "ebay.es", "ebay.com.au",
+          brand="ebay")
+def parse_ebay(html):
+    try:
+        tree = lxml.html.fromstring(html)
+
+        price = None
+        price_divs = _XP_EBAY_PRICE(tree)
+        if price_divs:
+            spans = _XP_EBAY_TEXTSPANS(price_divs[0])
+            if spans:
+                try:
+                    price = float(_EBAY_PRICE_JUNK_RE.sub('', _text(spans[0]).strip()).strip())
+                except ValueError:
+                    pass
+
+        # Quantity: "N available" / "N sold" spans
+        available_qty = sold_qty = None
+        qty_divs = _XP_EBAY_QTY(tree)
+        if qty_divs:
+            for span in _XP_EBAY_TEXTSPANS(qty_divs[0]):
+                text = _text(span).strip()
+                if 'available' in text.lower():
+                    available_qty = text
+                elif 'sold' in text.lower():
+                    sold_qty = text
+
+        in_stock = bool(available_qty and "available" in available_qty.lower())
+        return ProductInfo(price=price, in_stock=in_stock, available_qty=available_qty, sold_qty=sold_qty)
+
+    except Exception as e:
+        print(f"Error parsing eBay HTML: {e}")
+        return ProductInfo(error=True)
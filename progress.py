@@ -0,0 +1,131 @@
+import glob
+import json
+import os
+import time
+
+# --- CONFIGURATION ---
+# Compact run state for the dashboard, rewritten atomically while the run goes, "" = off
+PROGRESS_FILE = os.environ.get("SCRAPER_PROGRESS_FILE", "scraper_progress.json")
+# Min seconds between two writes of the file (rows can finish hundreds per second)
+PUBLISH_INTERVAL = 1.0
+# Throughput points kept for the dashboard chart, older ones are thinned out
+HISTORY_POINTS = 240
+
+
+class Progress:
+    """
+    Rows done / failed, rows/min, ETA, current window and stage latencies of
+    one run, published as a small JSON file the frontend polls instead of
+    re-reading the whole log:
+
+        progress = Progress(len(target_rows), windows=3, metrics=metrics, writer=writer)
+        progress.window(1, rows)
+        progress.row_done(failed=True)     # scrape phase
+        progress.row_retried(recovered=True)
+        progress.finish("done")
+
+    publish() is throttled to PUBLISH_INTERVAL, the file is written to a temp
+    file and renamed over the old one so a reader never sees half a file.
+    """
+
+    def __init__(self, total, windows=1, metrics=None, writer=None, path=PROGRESS_FILE):
+        self.path = path
+        self.metrics = metrics
+        self.writer = writer
+        self.started = time.monotonic()
+        self.state = {
+            "status": "running", "started_at": round(time.time(), 1), "elapsed_s": 0.0,
+            "total": total, "done": 0, "skipped": 0, "failed": 0, "recovered": 0, "written": 0,
+            "rows_per_min": 0.0, "eta_s": None,
+            "window": 0, "windows": windows, "window_rows": 0, "first_row": None, "last_row": None,
+            "stages": {}, "history": [],
+        }
+        self._published = 0.0
+        self.publish(force=True)
+
+    def window(self, n, rows, dropped=0):
+        """
+        Window n (1-based) of the job is starting, `rows` are its rows to scrape,
+        `dropped` the ones the scheduler left out (--stale-hours), not counted in the total.
+        """
+        self.state["total"] -= dropped
+        self.state.update(window=n, window_rows=len(rows),
+                          first_row=min(rows, default=None), last_row=max(rows, default=None))
+        self.publish(force=True)
+
+    def rows_skipped(self, n):
+        """Rows finished by the resumed run, done without being scraped again."""
+        self.state["skipped"] += n
+        self.state["done"] += n
+
+    def row_done(self, failed=False):
+        self.state["done"] += 1
+        self.state["failed"] += bool(failed)
+        self.publish()
+
+    def row_retried(self, recovered):
+        self.state["recovered"] += bool(recovered)
+        self.publish()
+
+    def publish(self, force=False):
+        now = time.monotonic()
+        if not self.path or (not force and now - self._published < PUBLISH_INTERVAL):
+            return
+        self._published = now
+        state = self.state
+        elapsed = now - self.started
+        scraped = state["done"] - state["skipped"]
+        rows_per_min = scraped / (elapsed / 60) if elapsed > 0 else 0.0
+        remaining = state["total"] - state["done"]
+        state.update(
+            elapsed_s=round(elapsed, 1),
+            rows_per_min=round(rows_per_min, 1),
+            eta_s=round(remaining / rows_per_min * 60) if rows_per_min and state["status"] == "running" else None,
+        )
+        if self.writer is not None:
+            state["written"] = self.writer.rows_written
+        if self.metrics is not None:
+            state["stages"] = {stage: {"p50": s["p50"], "p95": s["p95"], "count": s["count"]}
+                               for stage, s in self.metrics.summary()["stages"].items()}
+        history = state["history"]
+        history.append({"elapsed_s": state["elapsed_s"], "done": state["done"], "rows_per_min": state["rows_per_min"]})
+        if len(history) > HISTORY_POINTS:
+            # Keep the chart spanning the whole run: drop every other point of the older half
+            half = len(history) // 2
+            history[:half] = history[:half:2]
+
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.path)
+
+    def finish(self, status):
+        """Final write: "done", "stopped" or "failed"."""
+        self.state["status"] = status
+        self.publish(force=True)
+
+
+def read_progress(path=PROGRESS_FILE):
+    """The last published state, None if there is no (readable) progress file."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def job_progress_file(name, path=PROGRESS_FILE):
+    """Progress file of one job of a multi-job run: scraper_progress.json -> scraper_progress.<name>.json"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{name}{ext}"
+
+
+def read_job_progress(path=PROGRESS_FILE):
+    """{job name: last published state} of every job progress file next to `path`."""
+    root, ext = os.path.splitext(path)
+    jobs = {}
+    for job_path in sorted(glob.glob(f"{glob.escape(root)}.*{ext}")):
+        state = read_progress(job_path)
+        if state is not None:
+            jobs[job_path[len(root) + 1:len(job_path) - len(ext)]] = state
+    return jobs
@@ -0,0 +1,115 @@
+import random
+import threading
+import time
+
+# Outcome classes the controller reacts to
+OK = "ok"
+THROTTLED = "throttled"   # 429 / quota exceeded
+ERROR = "error"           # 5xx / timeout / connection error
+
+
+def classify_status(status):
+    if status == 429:
+        return THROTTLED
+    if status >= 500:
+        return ERROR
+    return OK
+
+
+def jittered_backoff(attempt, base=2.0, cap=60.0):
+    """Exponential backoff with 'equal jitter': half fixed, half random, so workers don't retry in lockstep."""
+    ceiling = min(cap, base * (2 ** attempt))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+class RateController:
+    """
+    Adaptive rate controller shared by every worker that talks to one provider
+    (scrape.do, Google Sheets, ...).
+
+    - Concurrency is AIMD: +1 slot per window of successes, halved on a 429
+      (once per cooldown), cut by a quarter on a 5xx/timeout, never below
+      `min_concurrency`.
+    - Optional token bucket (`max_rate` requests/sec) paces request starts, the
+      rate follows the same AIMD rule.
+    - A 429 also opens a jittered cooldown (or the server's Retry-After) that
+      every caller of wait_time() respects, so the whole pool backs off together.
+
+    Healthy runs never sleep, the controller only slows down when the provider pushes back.
+
+    `parent` is a controller for a quota above this one (e.g. one Google account
+    writing several spreadsheets): every request start is paced by both, and
+    every outcome is recorded on both, so a 429 on one child slows them all.
+    """
+
+    def __init__(self, name, max_concurrency=1, min_concurrency=1, max_rate=None, log=print, parent=None):
+        self.name = name
+        self.parent = parent
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+        self.max_rate = max_rate
+        self.min_rate = max_rate / 16 if max_rate else None
+        self.rate = max_rate
+        self.log = log
+        self.counts = {OK: 0, THROTTLED: 0, ERROR: 0}
+        self.total_wait = 0.0
+        self._throttle_streak = 0
+        self._next_start = 0.0
+        self._cooldown_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def concurrency(self):
+        return max(self.min_concurrency, int(self.limit))
+
+    def wait_time(self, not_before=0.0):
+        """Reserves the next request start (no earlier than monotonic `not_before`), returns the sleep before it."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, not_before, self._next_start, self._cooldown_until)
+            if self.rate:
+                self._next_start = start + 1.0 / self.rate
+            wait = start - now
+            self.total_wait += wait
+        if self.parent:
+            # The parent's slot comes after ours, the caller sleeps until both allow the start
+            wait = self.parent.wait_time(not_before=now + wait)
+        return wait
+
+    def record(self, outcome, retry_after=None):
+        if self.parent:
+            self.parent.record(outcome, retry_after)
+        with self._lock:
+            self.counts[outcome] += 1
+            if outcome == OK:
+                self._throttle_streak = 0
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+                if self.rate:
+                    self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+                return
+
+            if outcome == THROTTLED:
+                if time.monotonic() < self._cooldown_until:
+                    # Same burst of 429s, already backed off for it
+                    return
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                if self.rate:
+                    self.rate = max(self.min_rate, self.rate / 2)
+                pause = retry_after if retry_after else jittered_backoff(self._throttle_streak, base=5.0)
+                self._throttle_streak += 1
+                self._cooldown_until = max(self._cooldown_until, time.monotonic() + pause)
+            else:
+                self.limit = max(self.min_concurrency, self.limit * 0.75)
+                if self.rate:
+                    self.rate = max(self.min_rate, self.rate * 0.75)
+                pause = None
+
+        if pause:
+            self.log(f"⏳ {self.name} throttled, backing off {pause:.1f}s (concurrency → {self.concurrency})")
+
+    def summary(self):
+        rate = f", rate {self.rate:.2f}/s" if self.rate else ""
+        return (f"{self.name}: {self.counts[OK]} ok, {self.counts[THROTTLED]} throttled, "
+                f"{self.counts[ERROR]} errors, concurrency {self.concurrency}{rate}, "
+                f"{self.total_wait:.0f}s waited")
@@ -0,0 +1,96 @@
+import os
+
+from rate_control import jittered_backoff
+
+# --- Failure classes ---
+NETWORK = "network"              # connection error / timeout / 5xx
+THROTTLED = "throttled"          # 409 / 429, the rate controller's cooldown does the waiting
+BLOCKED = "blocked"              # captcha / robot page, wrong-location page: another proxy exit may work
+UNAVAILABLE = "unavailable"      # product gone or not sold (404, unavailable without a price): never refetched
+SELECTOR_MISS = "selector_miss"  # product page without a price where one was expected
+
+# --- CONFIGURATION ---
+# Refetches allowed per failure class, override with SCRAPER_RETRY_BUDGETS="network=3,blocked=1"
+DEFAULT_BUDGETS = {NETWORK: 2, THROTTLED: 3, BLOCKED: 2, UNAVAILABLE: 0, SELECTOR_MISS: 1}
+# Hard cap on fetches of one URL, whatever mix of failures it hits
+MAX_FETCHES = int(os.environ.get("SCRAPER_MAX_FETCHES", 4))
+# Backoff base seconds per class (0 = retry as soon as the rate controller allows)
+BACKOFF_BASE = {NETWORK: 2.0, THROTTLED: 0.0, BLOCKED: 1.0, SELECTOR_MISS: 2.0}
+
+# Markers of anti-bot / captcha interstitials (served with a 200)
+BLOCK_MARKERS = (
+    "Robot or human?", "px-captcha", "/blocked?url=",                         # Walmart (PerimeterX)
+    "Type the characters you see in this image", "/errors/validateCaptcha",  # Amazon
+    "Pardon Our Interruption", "Checking your browser before you access",    # eBay
+)
+
+
+def _env_budgets():
+    budgets = dict(DEFAULT_BUDGETS)
+    for item in os.environ.get("SCRAPER_RETRY_BUDGETS", "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() in budgets and value.strip().isdigit():
+            budgets[name.strip()] = int(value)
+    return budgets
+
+
+def classify_response(status, html=None):
+    """Failure class of one proxy response (None = usable page). `status` None means no response at all."""
+    if status is None or status >= 500:
+        return NETWORK
+    if status in (409, 429):
+        return THROTTLED
+    if status in (403, 407):
+        return BLOCKED
+    if status != 200:
+        # 404 / 410 and other 4xx: asking again gets the same answer
+        return UNAVAILABLE
+    if html is not None and any(marker in html for marker in BLOCK_MARKERS):
+        return BLOCKED
+    return None
+
+
+def classify_product(info):
+    """Failure class of a parsed page (parsers.ProductInfo), None if it has what we need."""
+    if info.error or info.cannot_ship:
+        return BLOCKED
+    if info.price is None:
+        return SELECTOR_MISS if info.in_stock else UNAVAILABLE
+    return None
+
+
+def is_transient(failure):
+    """Worth trying again in a later pass (the updater's retry phase)."""
+    return failure in (NETWORK, THROTTLED, BLOCKED)
+
+
+class RetryPolicy:
+    """
+    One retry budget per failure class instead of nested fixed loops. Per URL:
+
+        tries = {}
+        while True:
+            html, failure = fetch(url)          # + classify_product() of the parse
+            delay = policy.next_delay(failure, tries)
+            if delay is None:
+                break                            # success, permanent failure or budget spent
+            sleep(delay)
+
+    UNAVAILABLE has no budget (the page will not change), and no URL is fetched
+    more than `max_fetches` times in total.
+    """
+
+    def __init__(self, budgets=None, max_fetches=MAX_FETCHES):
+        self.budgets = {**_env_budgets(), **(budgets or {})}
+        self.max_fetches = max_fetches
+
+    def next_delay(self, failure, tries):
+        """Seconds to wait before refetching after `failure`, None = stop. Counts the retry in `tries`."""
+        if failure is None:
+            return None
+        used = tries.get(failure, 0)
+        if used >= self.budgets.get(failure, 0) or sum(tries.values()) + 1 >= self.max_fetches:
+            return None
+        tries[failure] = used + 1
+        base = BACKOFF_BASE.get(failure, 0.0)
+        return jittered_backoff(used, base=base) if base else 0.0
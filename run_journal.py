@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# --- CONFIGURATION ---
+JOURNAL_FILE = os.environ.get("SCRAPER_JOURNAL_FILE", "run_journal.jsonl")
+
+
+def job_journal_file(name, path=JOURNAL_FILE):
+    """Journal of one job of a multi-job run: run_journal.jsonl -> run_journal.<name>.jsonl"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{name}{ext}"
+
+
+def job_key(sheet_url, rows):
+    """Identifies a run: same sheet + same target rows = same job."""
+    digest = hashlib.sha1(",".join(map(str, rows)).encode()).hexdigest()[:12]
+    return f"{sheet_url}#{digest}"
+
+
+class RunJournal:
+    """
+    Append-only JSONL journal of one updater run, so a killed run can --resume.
+
+    Events:
+        {"event": "start", "job": ...}
+        {"event": "copy_done"}                                    Today → Old copy finished
+        {"event": "copy_done", "runs": [[3, 1002]]}               ... for these rows only (streaming windows)
+        {"event": "row", "phase": "scrape"|"retry", "row": 12,    row scraped, updates kept for replay
+         "flag": ..., "updates": [...]}
+        {"event": "flushed", "keys": [["scrape", 12], ...]}        rows written to the sheet
+        {"event": "done"}
+
+    Every line is flushed as it is written, a SIGTERM or crash loses at most the
+    line being written (a torn last line is ignored on load). In memory only
+    the flag of each row is kept, plus the updates of rows not written yet.
+    Thread-safe: the SheetWriter thread records flushes while the event loop
+    records rows and reads the pending replays.
+    """
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self.job = None
+        self.copy_done = False
+        self.copied_runs = []  # [(first, last)] rows copied by streaming windows
+        self.done = False
+        self.flags = {}        # (phase, row) -> flag
+        self.unflushed = {}    # (phase, row) -> updates, until they reach the sheet
+        self._lock = threading.RLock()  # file and in-memory state
+        self._file = None
+
+    def open(self, job, resume=False):
+        """
+        Starts journaling `job`. With resume=True and a journal for the same job on disk,
+        its state is loaded and appended to; otherwise the journal starts over.
+        Returns True if previous state was loaded.
+        """
+        loaded = resume and self._load(job)
+        if not loaded:
+            self.job = job
+            self.copy_done = False
+            self.copied_runs = []
+            self.done = False
+            self.flags, self.unflushed = {}, {}
+        self._file = open(self.path, "a" if loaded else "w", encoding="utf-8")
+        if not loaded:
+            self._write({"event": "start", "job": job, "ts": time.time()})
+        return loaded
+
+    def _load(self, job):
+        if not os.path.exists(self.path):
+            return False
+        events = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    break  # torn last line from a killed process
+        if not events or events[0].get("event") != "start" or events[0].get("job") != job:
+            return False
+
+        self.job = job
+        self.flags, self.unflushed = {}, {}
+        for event in events[1:]:
+            kind = event.get("event")
+            if kind == "copy_done":
+                if "runs" in event:
+                    self.copied_runs.extend(tuple(run) for run in event["runs"])
+                else:
+                    self.copy_done = True
+            elif kind == "row":
+                key = (event["phase"], event["row"])
+                self.flags[key] = event["flag"]
+                self.unflushed[key] = event["updates"]
+            elif kind == "flushed":
+                for phase, row in event["keys"]:
+                    self.unflushed.pop((phase, row), None)
+            elif kind == "done":
+                self.done = True
+        return True
+
+    def _write(self, event):
+        with self._lock:
+            self._file.write(json.dumps(event) + "\n")
+            self._file.flush()
+
+    def record_copy_done(self, runs=None):
+        """Whole job copied, or with `runs` ([(first, last)]) just those rows."""
+        with self._lock:
+            if runs is None:
+                self.copy_done = True
+                self._write({"event": "copy_done"})
+            else:
+                self.copied_runs.extend(runs)
+                self._write({"event": "copy_done", "runs": [list(run) for run in runs]})
+
+    def copied(self, row):
+        with self._lock:
+            return self.copy_done or any(first <= row <= last for first, last in self.copied_runs)
+
+    def record_row(self, phase, row, flag, updates):
+        with self._lock:
+            self.flags[(phase, row)] = flag
+            self.unflushed[(phase, row)] = updates
+            self._write({"event": "row", "phase": phase, "row": row, "flag": flag, "updates": updates})
+
+    def record_flushed(self, keys):
+        keys = [tuple(k) for k in keys if k is not None]
+        if not keys:
+            return
+        with self._lock:
+            for key in keys:
+                self.unflushed.pop(key, None)
+            self._write({"event": "flushed", "keys": [list(k) for k in keys]})
+
+    def record_done(self):
+        with self._lock:
+            self.done = True
+            self._write({"event": "done"})
+
+    def pending_replay(self, phase, rows=None):
+        """(row, updates) of `phase` scraped but never written, in row order, optionally only `rows`."""
+        with self._lock:
+            pending = [(row, updates) for (p, row), updates in self.unflushed.items()
+                       if p == phase and (rows is None or row in rows)]
+        return sorted(pending)
+
+    def rows_flagged(self, phase, flag, rows=None):
+        with self._lock:
+            return sorted(row for (p, row), f in self.flags.items()
+                          if p == phase and f == flag and (rows is None or row in rows))
+
+    def scraped(self, phase, row):
+        with self._lock:
+            return (phase, row) in self.flags
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,127 @@
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+# --- CONFIGURATION ---
+# DEBUG adds the per-link diagnostics (cache hits, fulfillment tags, ...), INFO is the production default
+LOG_LEVEL = os.environ.get("SCRAPER_LOG_LEVEL", "INFO").upper()
+# scraper.log is rotated to scraper.log.1 ... .N past this size
+LOG_MAX_MB = float(os.environ.get("SCRAPER_LOG_MAX_MB", 50))
+LOG_BACKUPS = int(os.environ.get("SCRAPER_LOG_BACKUPS", 3))
+# Buffered lines reach the file (and stdout) at least this often
+LOG_FLUSH_INTERVAL = 0.5
+# Echo the lines to stdout too; off when stdout is captured to a file (the frontend does)
+LOG_ECHO = os.environ.get("SCRAPER_LOG_ECHO", "1") != "0"
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+_STOP = object()
+
+
+def enabled(level, threshold=LOG_LEVEL):
+    """True if `level` messages pass `threshold`, for guarding costly diagnostics at the call site."""
+    return LEVELS[level] >= LEVELS.get(threshold, LEVELS["INFO"])
+
+
+class RunLog:
+    """
+    Non-blocking logger: callers only format the line and put it on a queue,
+    one writer thread appends the lines to `path` (kept open, buffered) and
+    echoes them to stdout, flushing both every `flush_interval` seconds.
+
+        log = RunLog("scraper.log").start()
+        log("🕷 Starting scrape...")
+        log(f"⚠️ Row {idx} failed", "WARNING")
+        log.close()    # drains the queue
+
+    Messages below `level` are dropped before formatting. The file is rotated
+    (path → path.1 → ... → path.<backups>) once it grows past `max_bytes`.
+    """
+
+    def __init__(self, path, level=LOG_LEVEL, max_bytes=LOG_MAX_MB * 1024 * 1024, backups=LOG_BACKUPS,
+                 flush_interval=LOG_FLUSH_INTERVAL, echo=LOG_ECHO):
+        self.path = path
+        self.level = LEVELS.get(level, LEVELS["INFO"])
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.echo = echo
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._thread = threading.Thread(target=self._run, name="run-log", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def __call__(self, msg, level="INFO"):
+        if LEVELS[level] < self.level:
+            return
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        prefix = "" if level == "INFO" else f"{level}: "
+        # A leading "\n" (section break) goes before the timestamp, not after the level
+        msg = str(msg)
+        body = msg.lstrip("\n")
+        self._queue.put(f"{msg[:len(msg) - len(body)]}[{timestamp}] {prefix}{body}\n")
+
+    def close(self):
+        """Writes out everything queued so far and stops the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _open(self):
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _rotate(self):
+        self._file.close()
+        for n in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{n}"):
+                os.replace(f"{self.path}.{n}", f"{self.path}.{n + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            open(self.path, "w").close()
+        self._open()
+
+    def _write(self, lines):
+        text = "".join(lines)
+        self._file.write(text)
+        if self.echo:
+            sys.stdout.write(text)
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _flush(self):
+        self._file.flush()
+        if self.echo:
+            sys.stdout.flush()
+
+    def _run(self):
+        self._open()
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                lines = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                lines = []
+            # Drain whatever else is queued, one write for the lot
+            try:
+                while len(lines) < 1000:
+                    lines.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            stop = _STOP in lines
+            lines = [line for line in lines if line is not _STOP]
+            if lines:
+                self._write(lines)
+            if stop or time.monotonic() - last_flush >= self.flush_interval:
+                self._flush()
+                last_flush = time.monotonic()
+            if stop:
+                self._file.close()
+                return
@@ -0,0 +1,89 @@
+from datetime import datetime
+
+# --- Priority weights ---
+W_STALE = 1.0       # per day since the last update (capped at MAX_STALE_DAYS)
+W_VOLATILE = 3.0    # relative Today vs Old price move (capped at 100%) + 1 if stock changed
+W_FAILED = 5.0      # last run flagged the row as FAILED
+MAX_STALE_DAYS = 7
+
+DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d")
+
+
+def _cell(row, col):
+    return row[col - 1].strip() if col and len(row) >= col else ""
+
+
+def _number(value):
+    try:
+        return float(str(value).replace("$", "").replace(",", "").strip())
+    except ValueError:
+        return None
+
+
+def _parse_date(value):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    return None
+
+
+def stale_hours(row, date_col, now):
+    """Hours since 'Stock Update Date', None if never updated / unreadable."""
+    updated = _parse_date(_cell(row, date_col))
+    if updated is None:
+        return None
+    return max(0.0, (now - updated).total_seconds() / 3600)
+
+
+def is_failed(row, flag_col):
+    return _cell(row, flag_col).upper().startswith("FAILED")
+
+
+def priority(row, cols, now):
+    """
+    Higher = scrape sooner. `cols` maps 'date', 'flag', 'today_price', 'old_price',
+    'today_stock', 'old_stock' to 1-based column numbers.
+    """
+    hours = stale_hours(row, cols["date"], now)
+    stale_days = MAX_STALE_DAYS if hours is None else min(hours / 24, MAX_STALE_DAYS)
+
+    volatility = 0.0
+    today_price, old_price = _number(_cell(row, cols["today_price"])), _number(_cell(row, cols["old_price"]))
+    if today_price is not None and old_price:
+        volatility += min(abs(today_price - old_price) / old_price, 1.0)
+    if _cell(row, cols["today_stock"]) != _cell(row, cols["old_stock"]):
+        volatility += 1.0
+
+    return W_STALE * stale_days + W_VOLATILE * volatility + W_FAILED * is_failed(row, cols["flag"])
+
+
+def schedule_rows(data, rows, cols, prioritize=False, min_stale_hours=None, now=None):
+    """
+    Picks and orders the rows to scrape from the already loaded sheet `data`
+    ({row number: values}, see sheet_reader.read_rows).
+
+    min_stale_hours: keep only rows last updated at least that long ago (plus
+                     never-updated and FAILED rows).
+    prioritize:      order by priority() instead of sheet order, so the most
+                     important listings are fresh first.
+    Rows outside `data` are kept, the updater reports them as out of bounds.
+    """
+    now = now or datetime.now()
+    selected = []
+    for idx in rows:
+        row = data.get(idx)
+        if row is None:
+            selected.append(idx)
+            continue
+        if min_stale_hours is not None:
+            hours = stale_hours(row, cols["date"], now)
+            if hours is not None and hours < min_stale_hours and not is_failed(row, cols["flag"]):
+                continue
+        selected.append(idx)
+
+    if prioritize:
+        scores = {idx: priority(data[idx], cols, now) if idx in data else 0.0 for idx in selected}
+        selected.sort(key=lambda idx: -scores[idx])
+    return selected
@@ -1,243 +1,361 @@
-import gspread
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
-from oauth2client.service_account import ServiceAccountCredentials
-import streamlit as st
+import os
+import sys
+import threading
 import time
-
-# Setup
-SCRAPING_ANT_API_KEY = st.secrets["api_keys"]["scraping_ant"]
-
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http_client import get_session, request_timeout, DEFAULT_POOL_SIZE
+from page_cache import PageCache, product_key
+from parse_stage import ParseStage, PARSE_WORKERS
+from rate_control import RateController, classify_status, OK, THROTTLED, ERROR
+from retry_policy import RetryPolicy, classify_product, classify_response
+from sheet_ranges import a1_range, chunked, coalesce_updates, row_runs
+from sheet_reader import read_header, read_rows
+from sheet_writer import safe_batch_update
+
+# --- CONFIGURATION ---
+FETCH_WORKERS = int(os.environ.get("SCRAPER_CONCURRENCY", DEFAULT_POOL_SIZE))
+WRITE_BATCH_RANGES = 500   # ranges per batch_update call
+READ_COLUMNS = ['Item Link', 'Old Price']   # the only inputs update_google_sheet needs
+# Streaming: rows per read → scrape → write window, 0 = the whole sheet at once
+WINDOW_ROWS = int(os.environ.get("SCRAPER_WINDOW_ROWS", 0))
+# Point SCRAPINGANT_ENDPOINT at a local mock server to run without the real API
+SCRAPINGANT_ENDPOINT = os.environ.get("SCRAPINGANT_ENDPOINT", "https://api.scrapingant.com/v2/general")
+
+# Setup: secrets and the gspread client are loaded on first use, not at import
+# (pandas / bs4 / gspread / streamlit are imported lazily for the same reason)
 scope = [
     "https://spreadsheets.google.com/feeds",
     "https://www.googleapis.com/auth/drive"
 ]
-credentials_dict = st.secrets["gcp_service_account"]
-credentials = ServiceAccountCredentials.from_json_keyfile_dict(credentials_dict, scope)
-gc = gspread.authorize(credentials)
+_secrets = None
+_client = None
+_lazy_lock = threading.Lock()
 
 
-# Helper to get worksheet
-def get_worksheet_from_url(sheet_url):
-    worksheet = gc.open_by_url(sheet_url).sheet1
-    return worksheet
+def get_secrets():
+    global _secrets
+    with _lazy_lock:
+        if _secrets is None:
+            import streamlit as st
+            _secrets = st.secrets
+    return _secrets
 
 
-# General retry function
-def fetch_html_with_retries(url, max_retries=3):
-    for attempt in range(max_retries):
-        api_url = f'https://api.scrapingant.com/v2/general?url={url}&x-api-key={SCRAPING_ANT_API_KEY}&browser=true'
-        response = requests.get(api_url)
+def get_client():
+    """gspread client, authorized on first use and reused afterwards."""
+    global _client
+    if _client is None:
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+        credentials = ServiceAccountCredentials.from_json_keyfile_dict(get_secrets()["gcp_service_account"], scope)
+        with _lazy_lock:
+            if _client is None:
+                _client = gspread.authorize(credentials)
+    return _client
 
-        if response.status_code == 200:
-            return response.text
-        elif response.status_code == 409:
-            print("409 Conflict. Retrying...")
-            time.sleep(2)
-        else:
-            print(f"❌ Attempt {attempt + 1} failed for URL: {url} - Status code: {response.status_code}")
-            if attempt == max_retries - 1:
-                return None
-    return None
 
+# Shared on-disk page cache, opened on first use
+# Bumped when parser output changes, so older cached results are not reused
+CACHE_PARSER = "scraper_v2"
+_page_cache = None
 
-# Walmart scraper
-def scrape_walmart_product(url, max_retries=3):
-    html = fetch_html_with_retries(url, max_retries)
-    if not html:
-        return None, False, True
 
-    try:
-        soup = BeautifulSoup(html, 'html.parser')
-
-        seller_tag = soup.find("span", attrs={"data-testid": "product-seller-info"})
-        in_stock = seller_tag and "Walmart.com" in seller_tag.text
-
-        if not in_stock:
-            unavailable_tag = soup.find("span", class_="b mr1")
-            if not unavailable_tag:
-                return None, False, True
-            not_available = "Not available" in unavailable_tag.text
-            if not_available:
-                return None, False, False
-
-        price_tag = soup.find("span", attrs={"itemprop": "price", "data-seo-id": "hero-price"})
-        price = None
-
-        if price_tag:
-            price_text = price_tag.text.strip().replace('$', '').replace(',', '')
-            try:
-                price = float(price_text)
-            except ValueError:
-                pass
-
-        return price, in_stock, False
-
-    except Exception as e:
-        print(f"Error parsing Walmart HTML: {e}")
-        return None, False, True
-
-
-# Amazon scraper
-# Amazon scraper
-def scrape_amazon_product(url, max_retries=3):
-    cannot_ship_text = "This item cannot be shipped to your selected delivery location. Please choose a different delivery location."
-    
-    for attempt in range(max_retries):
-        html = fetch_html_with_retries(url, max_retries)
-        if not html:
-            return None, False, True
+def get_page_cache():
+    global _page_cache
+    with _lazy_lock:
+        if _page_cache is None:
+            _page_cache = PageCache()
+    return _page_cache
 
-        try:
-            soup = BeautifulSoup(html, 'html.parser')
-
-            # Check for delivery restriction message
-            availability_tag = soup.find("div", id="availability")
-            if availability_tag:
-                availability_text = availability_tag.get_text(strip=True)
-                if cannot_ship_text in availability_text:
-                    if attempt < max_retries - 1:
-                        print(f"⚠️ Attempt {attempt + 1}: Cannot ship to location, retrying...")
-                        time.sleep(2)
-                        continue
-                    else:
-                        return cannot_ship_text, False, False  # Final fallback after retries
-
-            # Price extraction
-            price = None
-            price_span = soup.find('span', class_='a-price aok-align-center reinventPricePriceToPayMargin priceToPay')
-            if price_span:
-                price_whole = price_span.find('span', class_='a-price-whole')
-                price_fraction = price_span.find('span', class_='a-price-fraction')
-                if price_whole and price_fraction:
-                    price_text = price_whole.get_text(strip=True).replace(',', '') + price_fraction.get_text(strip=True)
-                    try:
-                        price = float(price_text)
-                    except ValueError:
-                        price = None
-
-            # In-stock logic
-            in_stock = False
-            if availability_tag:
-                if ("In Stock" in availability_text) or ("Only" in availability_text and "left in stock" in availability_text):
-                    in_stock = True
-
-            return price, in_stock, False
 
-        except Exception as e:
-            print(f"Error parsing Amazon HTML: {e}")
-            return None, False, True
+# Adaptive pacing shared by every ScrapingAnt call: requests in flight are capped at its
+# concurrency (halved on 409/429, grown back on success), like FetchEngine's gate
+scrapingant_rate = RateController("ScrapingAnt", max_concurrency=FETCH_WORKERS)
+_fetch_gate = threading.Condition()
+_fetch_in_flight = 0
 
+# Refetch budgets per failure class, shared by every worker
+retry_policy = RetryPolicy()
 
-# eBay scraper
-def scrape_ebay_product(url, max_retries=3):
-    html = fetch_html_with_retries(url, max_retries)
-    if not html:
-        return None, False, True, None, None
+# Sheets allows ~60 write requests/min per user: one controller for every write of the process (same account)
+sheets_rate = RateController("Google Sheets", max_concurrency=1, max_rate=1.0)
 
-    try:
-        soup = BeautifulSoup(html, 'html.parser')
-        # Price Extraction
-        price_tag = soup.find("div", {"class": "x-price-primary", "data-testid": "x-price-primary"})
-        price = None
-
-        if price_tag:
-            price_text_tag = price_tag.find("span", class_="ux-textspans")
-            if price_text_tag:
-                price_text = price_text_tag.text.strip()
-                price_text = price_text.replace('US', '').replace('$', '').replace('/ea', '').replace(',', '').strip()
-                try:
-                    price = float(price_text)
-                except ValueError:
-                    pass
-
-        # Quantity Info Extraction
-        qty_div = soup.find("div", {"id": "qtyAvailability"})
-        available_qty = None
-        sold_qty = None
-
-        if qty_div:
-            spans = qty_div.find_all("span", class_="ux-textspans")
-            for span in spans:
-                text = span.text.strip()
-                if 'available' in text.lower():
-                    available_qty = text
-                elif 'sold' in text.lower():
-                    sold_qty = text
-
-        # Determine in-stock
-        in_stock = True if available_qty and ("available" in available_qty.lower()) else False
-
-        return price, in_stock, False, available_qty, sold_qty
-
-    except Exception as e:
-        print(f"Error parsing eBay HTML: {e}")
-        return None, False, True, None, None
 
-# Decide which scraper to use
-def scrape_product(url, max_retries=3):
-    if "walmart.com" in url:
-        price, in_stock, error = scrape_walmart_product(url, max_retries)
-        return price, in_stock, error, None, None
-    elif "amazon." in url:
-        price, in_stock, error = scrape_amazon_product(url, max_retries)
-        return price, in_stock, error, None, None
-    elif "ebay." in url:
-        return scrape_ebay_product(url, max_retries)
+# Process pool for the CPU-bound parsing, created on first use
+_parse_stage = None
+
+
+def get_parse_stage():
+    global _parse_stage
+    with _lazy_lock:
+        if _parse_stage is None:
+            _parse_stage = ParseStage(PARSE_WORKERS)
+    return _parse_stage
+
+
+# Helper to get worksheet
+def get_worksheet_from_url(sheet_url):
+    worksheet = get_client().open_by_url(sheet_url).sheet1
+    return worksheet
+
+
+@contextmanager
+def fetch_slot():
+    """Waits for a free ScrapingAnt slot (scrapingant_rate.concurrency) and the pacing delay."""
+    global _fetch_in_flight
+    with _fetch_gate:
+        _fetch_gate.wait_for(lambda: _fetch_in_flight < scrapingant_rate.concurrency)
+        _fetch_in_flight += 1
+    try:
+        # Shared adaptive pacing: no wait on healthy runs, backs off together on 409/429
+        time.sleep(scrapingant_rate.wait_time())
+        yield
+    finally:
+        with _fetch_gate:
+            _fetch_in_flight -= 1
+            _fetch_gate.notify_all()
+
+
+# One ScrapingAnt request, the retries are scrape_page()'s (retry_policy budgets)
+def fetch_html(url):
+    """Returns (html or None, retry_policy failure class or None)."""
+    with fetch_slot():
+        return _fetch_html(url)
+
+
+def _fetch_html(url):
+    import requests
+    api_key = get_secrets()["api_keys"]["scraping_ant"]
+    params = {'url': url, 'x-api-key': api_key, 'browser': 'true'}
+    try:
+        response = get_session(FETCH_WORKERS).get(SCRAPINGANT_ENDPOINT, params=params, timeout=request_timeout())
+    except requests.RequestException as e:
+        scrapingant_rate.record(ERROR)
+        print(f"❌ Request failed for URL: {url} - {e}")
+        return None, classify_response(None)
+
+    if response.status_code == 200:
+        scrapingant_rate.record(OK)
+        return response.text, classify_response(200, response.text)
+    if response.status_code in (409, 429):
+        # ScrapingAnt answers 409 when we exceed the plan's concurrency
+        print(f"{response.status_code} Conflict. Retrying...")
+        scrapingant_rate.record(THROTTLED)
     else:
+        scrapingant_rate.record(classify_status(response.status_code))
+        print(f"❌ Request failed for URL: {url} - Status code: {response.status_code}")
+    return None, classify_response(response.status_code)
+
+
+# Fetch + parse one page with the parser registered for its host (parsers.PARSERS)
+def scrape_page(url, parse, policy=None):
+    """
+    Returns a parsers.ProductInfo, refetching per the retry policy: each failure
+    class (network, 409/429, blocked or wrong-location page, selector miss) has
+    its own budget, an unavailable product is never refetched.
+    """
+    from parsers import ProductInfo, AMAZON_CANNOT_SHIP_TEXT
+
+    policy = policy or retry_policy
+    tries = {}
+    while True:
+        html, failure = fetch_html(url)
+        if failure:
+            info = ProductInfo(error=True)
+        else:
+            # Parsers are module-level, so the parse stage can run them in worker processes
+            info = get_parse_stage().run(parse, html)
+            failure = classify_product(info)
+        delay = policy.next_delay(failure, tries)
+        if delay is None:
+            break
+        print(f"⚠️ {failure} for {url}, refetching ({sum(tries.values())})...")
+        time.sleep(delay)
+
+    if info.cannot_ship:
+        return ProductInfo(price=AMAZON_CANNOT_SHIP_TEXT, failure=failure)  # Final fallback after retries
+    return info._replace(failure=failure)
+
+
+# Decide which scraper to use: dict lookup on the hostname
+def scrape_product(url, use_cache=True):
+    from parsers import parser_for
+
+    if use_cache:
+        cached = get_page_cache().get(url, CACHE_PARSER)
+        if cached:
+            print(f"💾 Cache hit: {url}")
+            return tuple(cached)
+
+    parse = parser_for(url)
+    if parse is None:
         print(f"Unsupported URL: {url}")
         return None, False, True, None, None
 
+    info = scrape_page(url, parse)
+    result = info.price, info.in_stock, info.error, info.available_qty, info.sold_qty
 
-# Update the Google Sheet
-def update_google_sheet(worksheet):
-    data = worksheet.get_all_records()
-    df = pd.DataFrame(data)
+    # Errors are never cached so they get refetched next run
+    if use_cache and not result[2]:
+        get_page_cache().put(url, CACHE_PARSER, result)
+    return result
 
-    for idx, row in df.iterrows():
-        url = row['Item Link']
-        old_price = row.get('Old Price', None)
 
+def _scrape_unique(urls, use_cache, workers):
+    """Scrapes each unique product once, `workers` at a time. Returns {product_key: result or exception}."""
+    by_key = {}
+    for url in urls:
+        by_key.setdefault(product_key(url), url)
+
+    def scrape_one(url):
         print(f"Scraping: {url}")
         try:
-            new_price, in_stock, error, available_qty, sold_qty = scrape_product(url)
-            print(f"→ Price: {new_price}, In Stock: {in_stock}, Available: {available_qty}, Sold: {sold_qty}, Error: {error}")
+            result = scrape_product(url, use_cache=use_cache)
+            price, in_stock, error, available_qty, sold_qty = result
+            print(f"→ Price: {price}, In Stock: {in_stock}, Available: {available_qty}, Sold: {sold_qty}, Error: {error}")
+            return result
         except Exception as e:
             print(f"❌ Error scraping: {e}")
-            continue
-
-        row_index = idx + 2  # account for header row
+            return e
+
+    # One pooled connection per worker thread (the first call sizes the shared session)
+    get_session(workers)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return dict(zip(by_key, executor.map(scrape_one, by_key.values())))
+
+
+ERROR_TEXT = 'Check manually(error occurred)'
+
+
+def derive_sheet_columns(df, results, header=None):
+    """
+    Builds the New Price / In Stock / Price change (/ Available / Sold Quantity)
+    columns for every scraped row of `df` in one vectorized pass. The optional
+    quantity columns are written when `header` (default df.columns) has them.
+    `results` maps product_key -> scrape_product() tuple, or the exception that
+    aborted it (those rows are left out, the sheet keeps their old values).
+    """
+    import numpy as np
+    import pandas as pd
+
+    header = df.columns if header is None else header
+    per_row = df['Item Link'].map(lambda url: results[product_key(url)])
+    per_row = per_row[~per_row.map(lambda r: isinstance(r, Exception))]
+    if per_row.empty:
+        return pd.DataFrame()
+
+    scraped = pd.DataFrame(per_row.tolist(), index=per_row.index,
+                           columns=['new_price', 'in_stock', 'error', 'available', 'sold'])
+    new_price = scraped['new_price']
+    error = scraped['error'].astype(bool).to_numpy()
+
+    # Non-numeric / empty Old Price counts as missing, so no price change is computed
+    old_num = pd.to_numeric(df.loc[scraped.index, 'Old Price'], errors='coerce') if 'Old Price' in df.columns \
+        else pd.Series(np.nan, index=scraped.index)
+    new_num = pd.to_numeric(new_price, errors='coerce')
+    both = (new_num.notna() & old_num.notna()).to_numpy()
+
+    change = (new_num - old_num).round(2)
+    change_text = np.where(change > 0, '+', '') + change.astype(str)
+    price_change = np.where(~both, '', np.where(new_num == old_num, "0", change_text))
+
+    # Without an old price a falsy new price is written as an empty cell
+    blank = ~both & ~new_price.fillna(0).astype(bool).to_numpy()
+    new_out = new_price.astype(object).where(~blank, '')
+
+    out = pd.DataFrame(index=scraped.index)
+    out['New Price'] = np.where(error, ERROR_TEXT, new_out.to_numpy())
+    out['In Stock'] = np.where(error, ERROR_TEXT, np.where(scraped['in_stock'].astype(bool), 'Yes', 'OOS'))
+    out['Price change'] = np.where(error, "0", price_change)
+    if 'Available Quantity' in header:
+        out['Available Quantity'] = np.where(error, '', scraped['available'].fillna('').to_numpy())
+    if 'Sold Quantity' in header:
+        out['Sold Quantity'] = np.where(error, '', scraped['sold'].fillna('').to_numpy())
+
+    for url in df.loc[scraped.index[error], 'Item Link']:
+        print(f"Error scraping {url}, skipping...")
+    return out
+
+
+def _update_rows(worksheet, header, rows, use_cache, workers):
+    """Read → scrape → derive → write for `rows` (None = every row). Returns the number of rows read."""
+    import pandas as pd
+
+    names = [name for name in READ_COLUMNS if name in header]
+    data = read_rows(worksheet, header, names, rows)
+    if not data:
+        return 0
+    df = pd.DataFrame({name: [data[r][header.index(name)] for r in data] for name in names},
+                      index=[r - 2 for r in data])  # index = row - header row - 1, as with get_all_records
+
+    results = _scrape_unique(df['Item Link'], use_cache, workers)
+    out = derive_sheet_columns(df, results, header)
+    if out.empty:
+        return len(data)
+
+    # One range per output column and run of consecutive rows
+    updates = []
+    runs = row_runs(out.index + 2)  # account for header row
+    for column in out.columns:
+        col = header.index(column) + 1
+        values = out[column]
+        for start, end in runs:
+            run = values.loc[start - 2:end - 2].tolist()
+            updates.append({'range': a1_range(start, col, end, col), 'values': [[v] for v in run]})
+
+    # Coalesced first, so chunks hold whole column runs
+    batches = chunked(coalesce_updates(updates), WRITE_BATCH_RANGES)
+    for batch in batches:
+        safe_batch_update(worksheet, batch, sheets_rate)
+    print(f"✅ Wrote {out.size} cells in {len(batches)} batch_update call(s)")
+    return len(data)
 
-        if error:
-            print(f"Error scraping {url}, skipping...")
-            worksheet.update_cell(row_index, df.columns.get_loc('New Price') + 1, 'Check manually(error occurred)')
-            worksheet.update_cell(row_index, df.columns.get_loc('In Stock') + 1, 'Check manually(error occurred)')
-            worksheet.update_cell(row_index, df.columns.get_loc('Price change') + 1, "0")
 
-            # Optional: Clear available/sold if error (only if columns exist)
-            if 'Available Quantity' in df.columns:
-                worksheet.update_cell(row_index, df.columns.get_loc('Available Quantity') + 1, '')
-            if 'Sold Quantity' in df.columns:
-                worksheet.update_cell(row_index, df.columns.get_loc('Sold Quantity') + 1, '')
-        else:
-            # Update In Stock
-            worksheet.update_cell(row_index, df.columns.get_loc('In Stock') + 1, 'OOS' if not in_stock else 'Yes')
-
-            # Update New Price and Price Change
-            if new_price is not None and old_price is not None:
-                worksheet.update_cell(row_index, df.columns.get_loc('New Price') + 1, new_price)
-                if new_price != old_price:
-                    change = round(new_price - old_price, 2)
-                    worksheet.update_cell(row_index, df.columns.get_loc('Price change') + 1, f"{'+' if change > 0 else ''}{change}")
-                else:
-                    worksheet.update_cell(row_index, df.columns.get_loc('Price change') + 1, "0")
-            else:
-                worksheet.update_cell(row_index, df.columns.get_loc('New Price') + 1, new_price or '')
-                worksheet.update_cell(row_index, df.columns.get_loc('Price change') + 1, '')
-
-            # Update Available Quantity and Sold Quantity if present
-            if 'Available Quantity' in df.columns:
-                worksheet.update_cell(row_index, df.columns.get_loc('Available Quantity') + 1, available_qty or '')
-            if 'Sold Quantity' in df.columns:
-                worksheet.update_cell(row_index, df.columns.get_loc('Sold Quantity') + 1, sold_qty or '')
+# Update the Google Sheet
+def update_google_sheet(worksheet, use_cache=True, workers=FETCH_WORKERS, window_rows=WINDOW_ROWS):
+    """
+    Scrapes every row concurrently (one fetch per unique product), derives the
+    output columns in memory (derive_sheet_columns) and writes them back in a
+    few batch_update calls (column ranges, coalesced) instead of one
+    update_cell call per cell.
+
+    window_rows > 0 streams the sheet instead: each window of rows is read,
+    scraped and written before the next one is read, so memory does not grow
+    with the sheet (duplicate links are then deduped per window, the page
+    cache still covers repeats across windows).
+    """
+    # Header, then only the input columns (not get_all_records() of the whole sheet)
+    header = read_header(worksheet)
+    if not window_rows:
+        _update_rows(worksheet, header, None, use_cache, workers)
+        return
+
+    # The grid size bounds the windows, blank stretches inside the sheet don't end the job
+    for start in range(2, worksheet.row_count + 1, window_rows):
+        rows = range(start, min(start + window_rows, worksheet.row_count + 1))
+        print(f"🪟 Rows {rows.start}-{rows.stop - 1}")
+        _update_rows(worksheet, header, rows, use_cache, workers)
+
+
+def main(argv=None):
+    """python scraper.py <sheet_url> [--no-cache] [--window=N]"""
+    argv = sys.argv[1:] if argv is None else argv
+    urls = [a for a in argv if not a.startswith("--")]
+    if not urls:
+        print(main.__doc__)
+        return 2
+    try:
+        window_rows = next((int(a.split("=", 1)[1]) for a in argv if a.startswith("--window=")), WINDOW_ROWS)
+        update_google_sheet(get_worksheet_from_url(urls[0]), use_cache="--no-cache" not in argv,
+                            window_rows=window_rows)
+    finally:
+        if _page_cache is not None:
+            _page_cache.close()
+        if _parse_stage is not None:
+            _parse_stage.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import re
+
+_A1_RE = re.compile(r"^([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?$")
+
+
+# --- Helper to convert column number to letter (Handles A-Z, AA-ZZ, etc.) ---
+def get_col_letter(col_idx):
+    """Converts 1 -> A, 27 -> AA, 28 -> AB"""
+    string = ""
+    while col_idx > 0:
+        col_idx, remainder = divmod(col_idx - 1, 26)
+        string = chr(65 + remainder) + string
+    return string
+
+
+def col_index(letters):
+    """Converts A -> 1, AA -> 27, AB -> 28"""
+    idx = 0
+    for ch in letters:
+        idx = idx * 26 + (ord(ch) - 64)
+    return idx
+
+
+def a1_range(row1, col1, row2, col2):
+    start = f"{get_col_letter(col1)}{row1}"
+    if (row1, col1) == (row2, col2):
+        return start
+    return f"{start}:{get_col_letter(col2)}{row2}"
+
+
+def row_runs(rows):
+    """Groups row indices into runs of consecutive rows: [3,4,5,9] -> [(3, 5), (9, 9)]"""
+    runs = []
+    for row in sorted(set(rows)):
+        if runs and runs[-1][1] == row - 1:
+            runs[-1] = (runs[-1][0], row)
+        else:
+            runs.append((row, row))
+    return runs
+
+
+def chunked(items, size):
+    """Splits a list of ranges into batch_update payloads of at most `size` ranges."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def coalesce_updates(updates):
+    """
+    Merges batch_update ranges into the fewest rectangular ranges.
+
+    Every cell is expanded into a grid (later writes win, same as batch_update
+    applies ranges in order). Each row is split into runs of adjacent columns,
+    then identical runs on consecutive rows are stacked into one rectangle.
+    50 rows x 5 single cells -> one range per group of adjacent columns.
+
+    Ranges that are not plain A1 cells/rectangles (e.g. 'A:A') are passed
+    through untouched.
+    """
+    grids = {}   # sheet prefix -> {(row, col): value}
+    passthrough = []
+
+    for update in updates:
+        rng = update['range']
+        prefix, _, ref = rng.rpartition('!')
+        m = _A1_RE.match(ref.replace('$', '').upper())
+        if not m:
+            passthrough.append(update)
+            continue
+
+        row1, col1 = int(m.group(2)), col_index(m.group(1))
+        grid = grids.setdefault(prefix, {})
+        for r_off, row_values in enumerate(update['values']):
+            for c_off, value in enumerate(row_values):
+                grid[(row1 + r_off, col1 + c_off)] = value
+
+    merged = []
+    for prefix, grid in grids.items():
+        # 1. Horizontal runs per row: {row: [(col_start, col_end), ...]}
+        row_runs = {}
+        for row, col in sorted(grid):
+            runs = row_runs.setdefault(row, [])
+            if runs and runs[-1][1] == col - 1:
+                runs[-1] = (runs[-1][0], col)
+            else:
+                runs.append((col, col))
+
+        # 2. Stack identical runs on consecutive rows
+        open_rects = {}   # (col_start, col_end) -> [row_start, row_end]
+        rects = []
+        for row in sorted(row_runs):
+            current = set(row_runs[row])
+            for span in list(open_rects):
+                if span not in current or open_rects[span][1] != row - 1:
+                    rects.append((span, open_rects.pop(span)))
+            for span in row_runs[row]:
+                if span in open_rects:
+                    open_rects[span][1] = row
+                else:
+                    open_rects[span] = [row, row]
+        rects.extend(open_rects.items())
+
+        for (col_start, col_end), (row_start, row_end) in sorted(rects, key=lambda r: (r[1][0], r[0][0])):
+            values = [
+                [grid[(r, c)] for c in range(col_start, col_end + 1)]
+                for r in range(row_start, row_end + 1)
+            ]
+            ref = a1_range(row_start, col_start, row_end, col_end)
+            merged.append({'range': f"{prefix}!{ref}" if prefix else ref, 'values': values})
+
+    return merged + passthrough
@@ -0,0 +1,45 @@
+from sheet_ranges import get_col_letter, a1_range, row_runs, chunked
+
+# --- CONFIGURATION ---
+# batch_get is a GET with every range in the query string, keep each call well under URL limits
+READ_BATCH_RANGES = 200
+
+
+def read_header(worksheet, header_row=1):
+    return worksheet.row_values(header_row)
+
+
+def read_rows(worksheet, header, names, rows=None, first_row=2):
+    """
+    Partial replacement for get_all_values(): reads only the `names` columns,
+    for `rows` (sheet row numbers) or, with rows=None, from `first_row` down.
+    Ranges go out through batch_get, one per run of consecutive rows x run of
+    adjacent columns, so a 20-row job costs a few small reads whatever the
+    sheet size.
+
+    Returns {row number: values}, each row as wide as `header` so row[col - 1]
+    works exactly as on get_all_values() data (columns not read are '').
+    Trailing rows with nothing in the read columns are dropped, the way
+    get_all_values() ends at the last non-empty row.
+    """
+    col_runs = row_runs(header.index(name) + 1 for name in names)
+    if rows is None:
+        # Open-ended A1 ranges ("C2:C"), the API stops at the last filled row
+        ranges = [(first_row, c1, None, c2) for c1, c2 in col_runs]
+    else:
+        ranges = [(r1, c1, r2, c2) for r1, r2 in row_runs(rows) for c1, c2 in col_runs]
+
+    result = {}
+    for batch in chunked(ranges, READ_BATCH_RANGES):
+        a1 = [a1_range(r1, c1, r2, c2) if r2 else f"{get_col_letter(c1)}{r1}:{get_col_letter(c2)}"
+              for r1, c1, r2, c2 in batch]
+        for (r1, c1, r2, c2), values in zip(batch, worksheet.batch_get(a1)):
+            for offset, cells in enumerate(values):
+                row = result.setdefault(r1 + offset, [""] * len(header))
+                row[c1 - 1:c1 - 1 + len(cells)] = cells
+
+    filled = [r for r, row in result.items() if any(row)]
+    last_row = max(filled, default=0)
+    if rows is None:
+        rows = range(first_row, last_row + 1)
+    return {r: result.get(r) or [""] * len(header) for r in rows if r <= last_row}
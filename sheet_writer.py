@@ -0,0 +1,130 @@
+import queue
+import threading
+import time
+from rate_control import OK, THROTTLED
+from sheet_ranges import coalesce_updates
+
+_STOP = object()
+
+
+def safe_batch_update(worksheet, data, rate, log=print, attempts=5, metrics=None):
+    """
+    Writes MULTIPLE ranges in ONE API call.
+    data format: [{'range': 'A1', 'values': [['v']]}, ...]
+    Adjacent cells are coalesced into rectangles first, so 50 rows x 5 cells
+    becomes a handful of ranges instead of 250. `rate` is the run's Google
+    Sheets RateController, it paces the calls and holds the quota cooldown.
+    `metrics` (optional) gets the quota sleeps, call latency and 429 retries.
+    """
+    data = coalesce_updates(data)
+    for attempt in range(attempts):
+        wait = rate.wait_time()
+        time.sleep(wait)
+        started = time.monotonic()
+        try:
+            # gspread batch_update takes a list of range objects
+            worksheet.batch_update(data)
+            rate.record(OK)
+            if metrics:
+                metrics.observe("sheets_wait", wait)
+                metrics.observe("sheets_write", time.monotonic() - started, ranges=len(data))
+            return
+        except Exception as e:
+            if "429" in str(e) or "quota" in str(e).lower():
+                log(f"⏳ API Quota hit (Batch), attempt {attempt + 1}/{attempts}")
+                rate.record(THROTTLED)
+                if metrics:
+                    metrics.observe("sheets_wait", wait)
+                    metrics.count("sheets_throttled")
+            else:
+                raise e
+    raise RuntimeError(f"Google Sheets quota still exceeded after {attempts} attempts")
+
+
+class SheetWriter:
+    """
+    Writer stage of the scrape pipeline.
+
+    Finished rows are submit()-ed from the fetch side and streamed into a
+    queue. A single background thread buffers them and flushes through
+    `write_fn` (e.g. safe_batch_update) when either `flush_rows` rows are
+    buffered or `flush_interval` seconds passed since the last flush.
+    Quota backoff therefore sleeps in this thread only, never in a fetch worker.
+
+    `on_flush(keys)` is called after each successful write with the keys given
+    to submit() for the rows in that batch (e.g. for a checkpoint journal).
+    """
+
+    def __init__(self, write_fn, flush_rows=50, flush_interval=10.0, log=print, on_flush=None):
+        self.write_fn = write_fn
+        self.on_flush = on_flush
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.log = log
+        self.rows_written = 0
+        self.batches_written = 0
+        self.failed_batches = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="sheet-writer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, updates, key=None):
+        """Queue ONE row's ranges: [{'range': 'A1', 'values': [['v']]}, ...]"""
+        self._queue.put((updates, key))
+
+    def close(self):
+        """Flush whatever is buffered and wait for the writer thread to finish."""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _flush(self, buffer, keys):
+        if not buffer:
+            return
+        rows = len(keys)
+        self.log(f"📤 Writing Block ({rows} rows) to Google Sheets...")
+        try:
+            self.write_fn(buffer)
+            self.rows_written += rows
+            self.batches_written += 1
+            self.log(f"✅ Block complete.\n")
+        except Exception as e:
+            # Keep the writer alive, the rest of the run can still be saved
+            self.failed_batches += 1
+            self.log(f"❌ Block write failed ({rows} rows): {e}")
+            return
+        if self.on_flush:
+            self.on_flush(keys)
+
+    def _run(self):
+        buffer = []
+        keys = []
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(buffer, keys)
+                return
+            if item is not None:
+                updates, key = item
+                buffer.extend(updates)
+                keys.append(key)
+
+            due = time.monotonic() - last_flush >= self.flush_interval
+            if len(keys) >= self.flush_rows or due:
+                self._flush(buffer, keys)
+                buffer, keys = [], []
+                last_flush = time.monotonic()
@@ -1,148 +1,207 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from bs4 import BeautifulSoup
-import requests
-import urllib.parse
+import asyncio
+import atexit
 import re
 import time
 from datetime import datetime
 import sys
-import streamlit as st
 import os
-from concurrent.futures import ThreadPoolExecutor  # Added for concurrency
+import signal
+import threading
+from types import SimpleNamespace
+from fetch_engine import FetchEngine, DEFAULT_CONCURRENCY, SCRAPE_DO_MAX_RATE
+from rate_control import RateController
+from retry_policy import RetryPolicy, classify_product, is_transient
+from sheet_writer import SheetWriter, safe_batch_update
+from run_journal import RunJournal, job_key, JOURNAL_FILE
+from page_cache import PageCache, FingerprintStore, product_key
+from parse_stage import ParseStage, PARSE_WORKERS as DEFAULT_PARSE_WORKERS
+from scheduler import schedule_rows
+from metrics import Metrics, METRICS_PORT
+from run_log import RunLog, enabled
+from progress import Progress, PROGRESS_FILE
+from sheet_ranges import get_col_letter, a1_range, row_runs, chunked
+from sheet_reader import read_header, read_rows
+
+# gspread / oauth2client / streamlit and the parsers (bs4, lxml) are imported where
+# they are first needed, so importing this module or failing on bad arguments is instant.
 
 # --- CONFIGURATION ---
-try:
-    LOG_FILE = "scraper.log"
-
-    def log(msg):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        line = f"[{timestamp}] {msg}"
-        print(line, flush=True)
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(line + "\n")
-
-    # Clear old logs if running new session
-    open(LOG_FILE, "w").close()
-    log(" Walmart sheet updater started...")
-
-    # --- CONFIGURATION ---
-    GCP_CREDENTIALS_FILE = 'credentials.json'
-    SCRAPER_DO_API_KEY = st.secrets["api_keys"]["scraper_do"]
-    TARGET_SHEET_URL = 'https://docs.google.com/spreadsheets/d/1miyn4Y1UZKgJRcOEwKQ6qJCG94tBUFSiGThA3AQI2TU/edit?gid=1224872406#gid=1224872406'
-
-    # --- AUTHORIZATION ---
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    credentials_dict = st.secrets["gcp_service_account"]
-    credentials = ServiceAccountCredentials.from_json_keyfile_dict(credentials_dict, scope)
-    gc = gspread.authorize(credentials)
-    client = gc
-
-    def safe_batch_update(worksheet, data):
-        """
-        Writes MULTIPLE ranges in ONE API call.
-        data format: [{'range': 'A1', 'values': [['v']]}, ...]
-        """
-        for attempt in range(5):
-            try:
-                # gspread batch_update takes a list of range objects
-                worksheet.batch_update(data)
-                return
-            except Exception as e:
-                if "429" in str(e) or "quota" in str(e).lower():
-                    wait_time = 15 + (attempt * 10)
-                    log(f"⏳ API Quota hit (Batch). Sleeping {wait_time}s...")
-                    time.sleep(wait_time)
-                else:
-                    raise e
-
-    # --- ARGUMENT PARSING (Range vs List) ---
-    target_rows = []
-    is_list_mode = False
-
-    # Default fallbacks
-    start_row = 3
-    end_row = 3
-
-    if len(sys.argv) >= 3:
-        if sys.argv[1] == "list":
+LOG_FILE = "scraper.log"
+GCP_CREDENTIALS_FILE = 'credentials.json'
+TARGET_SHEET_URL = 'https://docs.google.com/spreadsheets/d/1miyn4Y1UZKgJRcOEwKQ6qJCG94tBUFSiGThA3AQI2TU/edit?gid=1224872406#gid=1224872406'
+# Max scrape.do requests in flight for the WHOLE run (shared by all rows and links)
+MAX_CONCURRENCY = int(os.environ.get("SCRAPER_CONCURRENCY", DEFAULT_CONCURRENCY))
+# Parse processes (CPU stage), independent of the fetch concurrency
+PARSE_WORKERS = int(os.environ.get("SCRAPER_PARSE_WORKERS", DEFAULT_PARSE_WORKERS))
+SHEETS_MAX_WRITES_PER_SEC = 1.0
+# Max ranges per batch_update request when copying Today → Old in list mode
+LIST_COPY_BATCH_RANGES = 500
+# Streaming: rows per window (read → copy → scrape → write), 0 = the whole job at once
+WINDOW_ROWS = int(os.environ.get("SCRAPER_WINDOW_ROWS", 0))
+CACHE_PARSER = "walmart_updater"
+# The only columns a run reads (date / flag feed the scheduler)
+READ_COLUMNS = ["Walmart Link", "Today Price", "Old Price", "Today Stock", "Old Stock",
+                "BuyBox Winner", "Stock Update Date", "Flag"]
+
+SCOPE = [
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+
+# --- LOGGING (one buffered writer thread, see run_log.py) ---
+# Per-link / per-row diagnostics are only built when SCRAPER_LOG_LEVEL=DEBUG
+VERBOSE = enabled("DEBUG")
+_run_log = None
+_run_log_lock = threading.Lock()
+
+
+def get_run_log():
+    global _run_log
+    if _run_log is None:
+        with _run_log_lock:
+            if _run_log is None:
+                _run_log = RunLog(LOG_FILE).start()
+                atexit.register(_run_log.close)
+    return _run_log
+
+
+def log(msg, level="INFO"):
+    get_run_log()(msg, level)
+
+
+# --- AUTHORIZATION (lazy, cached for the process) ---
+_secrets = None
+_client = None
+
+
+def get_secrets():
+    global _secrets
+    if _secrets is None:
+        import streamlit as st
+        _secrets = st.secrets
+    return _secrets
+
+
+def get_client():
+    """gspread client, authorized on first use and reused afterwards."""
+    global _client
+    if _client is None:
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+        credentials_dict = get_secrets()["gcp_service_account"]
+        credentials = ServiceAccountCredentials.from_json_keyfile_dict(credentials_dict, SCOPE)
+        _client = gspread.authorize(credentials)
+    return _client
+
+
+# --- ARGUMENT PARSING (Range vs List) ---
+def parse_args(argv):
+    """
+    Positional args: `start end` or `list 3,5,10` (default: row 3).
+    Flags (e.g. --no-cache) can go anywhere.
+    """
+    cli_flags = {a for a in argv if a.startswith("--")}
+    cli_args = [a for a in argv if not a.startswith("--")]
+    options = SimpleNamespace(
+        use_cache="--no-cache" not in cli_flags,
+        # Reuse the last parse of pages whose relevant regions did not change
+        use_fingerprints="--no-fingerprints" not in cli_flags,
+        # Write rows even when price / stock / buybox are what the sheet already shows
+        rewrite_unchanged="--rewrite-unchanged" in cli_flags,
+        resume="--resume" in cli_flags,
+        prioritize="--priority" in cli_flags,
+        min_stale_hours=next((float(f.split("=", 1)[1]) for f in cli_flags if f.startswith("--stale-hours=")), None),
+        # None = parsers.WALMART_PARSER_ENGINE
+        parser_engine=next((f.split("=", 1)[1] for f in cli_flags if f.startswith("--parser=")), None),
+        window_rows=next((int(f.split("=", 1)[1]) for f in cli_flags if f.startswith("--window=")), WINDOW_ROWS),
+        metrics_port=next((int(f.split("=", 1)[1]) for f in cli_flags if f.startswith("--metrics-port=")), METRICS_PORT),
+        target_rows=[],
+        is_list_mode=False,
+        # Default fallbacks
+        start_row=3,
+        end_row=3,
+    )
+
+    if len(cli_args) >= 2:
+        if cli_args[0] == "list":
             # LIST MODE: Expects comma-separated string "3,5,10"
-            is_list_mode = True
-            raw_indices = sys.argv[2].split(',')
+            options.is_list_mode = True
+            raw_indices = cli_args[1].split(',')
             # Convert to distinct integers and sort
-            target_rows = sorted(list(set([int(x) for x in raw_indices if x.strip().isdigit()])))
-            log(f"📋 Mode: Specific Rows ({len(target_rows)} rows: {target_rows})")
+            options.target_rows = sorted(list(set([int(x) for x in raw_indices if x.strip().isdigit()])))
+            log(f"📋 Mode: Specific Rows ({len(options.target_rows)} rows: {options.target_rows})")
         else:
             # RANGE MODE: Expects start end
-            start_row = int(sys.argv[1])
-            end_row = int(sys.argv[2])
-            if start_row > end_row:
+            options.start_row = int(cli_args[0])
+            options.end_row = int(cli_args[1])
+            if options.start_row > options.end_row:
                 raise ValueError("start_row should be less than or equal to end_row")
-            target_rows = list(range(start_row, end_row + 1))
-            log(f"📉 Mode: Range ({start_row} to {end_row})")
+            options.target_rows = list(range(options.start_row, options.end_row + 1))
+            log(f"📉 Mode: Range ({options.start_row} to {options.end_row})")
     else:
         # Fallback default
-        target_rows = [3]
-
-    # --- OPEN SHEET ---
-    sheet = client.open_by_url(TARGET_SHEET_URL).get_worksheet(0)
-    data = sheet.get_all_values()
-    header = data[0]
-    
-    # --- Column helper ---
+        options.target_rows = [3]
+    return options
+
+
+# --- Column helper ---
+def sheet_columns(header):
+    """1-based column numbers by role, keys match what scheduler.priority() expects."""
     def col(name):
         return header.index(name) + 1
 
-    # --- Helper to convert column number to letter (Handles A-Z, AA-ZZ, etc.) ---
-    def get_col_letter(col_idx):
-        """Converts 1 -> A, 27 -> AA, 28 -> AB"""
-        string = ""
-        while col_idx > 0:
-            col_idx, remainder = divmod(col_idx - 1, 26)
-            string = chr(65 + remainder) + string
-        return string
-
-    link_col = col("Walmart Link")
-    today_price_col = col("Today Price")
-    old_price_col = col("Old Price")
-    today_stock_col = col("Today Stock")
-    old_stock_col = col("Old Stock")
-    buybox_col = col("BuyBox Winner")
-    date_col = col("Stock Update Date")
-    flag_col = col("Flag") 
-
-    # --- STEP 1: Copy Today → Old (once for all rows) ---
-    log("🔁 Copying Today → Old columns...")
-
-    if is_list_mode:
-        # LIST MODE: Update one by one (safest for scattered rows)
-        for r_idx in target_rows:
-            if r_idx - 1 < len(data):
-                row_data = data[r_idx - 1]
-                t_price = row_data[today_price_col - 1]
-                t_stock = row_data[today_stock_col - 1]
-                
-                # OPTIMIZATION: Combine these 2 calls into 1 batch for this row
-                updates = [
-                    {'range': f"{get_col_letter(old_price_col)}{r_idx}", 'values': [[t_price]]},
-                    {'range': f"{get_col_letter(old_stock_col)}{r_idx}", 'values': [[t_stock]]}
-                ]
-                safe_batch_update(sheet, updates)
+    return {
+        'link': col("Walmart Link"),
+        'today_price': col("Today Price"),
+        'old_price': col("Old Price"),
+        'today_stock': col("Today Stock"),
+        'old_stock': col("Old Stock"),
+        'buybox': col("BuyBox Winner"),
+        'date': col("Stock Update Date"),
+        'flag': col("Flag"),
+    }
+
+
+# --- STEP 1: Copy Today → Old (once per row, before it is scraped) ---
+def copy_today_to_old(write, data, cols, rows, list_mode, log=log):
+    """
+    `data` is {row number: values} as returned by sheet_reader.read_rows().
+    list_mode=False copies `rows` (consecutive, in any order: --priority reorders
+    them) as one range per column.
+    """
+    if not list_mode and len(row_runs(rows)) > 1:
+        list_mode = True
+    if list_mode:
+        # LIST MODE: Build every copy range up front, one range per run of consecutive rows
+        copy_rows = [r_idx for r_idx in rows if r_idx in data]
+        copy_updates = []
+        for run_start, run_end in row_runs(copy_rows):
+            rows_slice = [data[r_idx] for r_idx in range(run_start, run_end + 1)]
+            copy_updates.extend([
+                {'range': a1_range(run_start, cols['old_price'], run_end, cols['old_price']),
+                 'values': [[row[cols['today_price'] - 1]] for row in rows_slice]},
+                {'range': a1_range(run_start, cols['old_stock'], run_end, cols['old_stock']),
+                 'values': [[row[cols['today_stock'] - 1]] for row in rows_slice]}
+            ])
+
+        batches = chunked(copy_updates, LIST_COPY_BATCH_RANGES)
+        log(f"    ↳ {len(copy_rows)} rows → {len(copy_updates)} ranges in {len(batches)} batch request(s)")
+        for batch in batches:
+            write(batch)
     else:
         # RANGE MODE: Bulk update (Faster, original logic)
-        rows_slice = data[start_row - 1:end_row]
-        old_price_values = [[row[today_price_col - 1]] for row in rows_slice]
-        old_stock_values = [[row[today_stock_col - 1]] for row in rows_slice]
-
-        log(old_price_values)
-        log(old_stock_values)
-        
-        old_price_range = f"{get_col_letter(old_price_col)}{start_row}:{get_col_letter(old_price_col)}{end_row}"
-        old_stock_range = f"{get_col_letter(old_stock_col)}{start_row}:{get_col_letter(old_stock_col)}{end_row}"
+        start_row, end_row = min(rows), max(rows)
+        rows_slice = [data[r_idx] for r_idx in range(start_row, end_row + 1) if r_idx in data]
+        old_price_values = [[row[cols['today_price'] - 1]] for row in rows_slice]
+        old_stock_values = [[row[cols['today_stock'] - 1]] for row in rows_slice]
+
+        old_price_range = f"{get_col_letter(cols['old_price'])}{start_row}:{get_col_letter(cols['old_price'])}{end_row}"
+        old_stock_range = f"{get_col_letter(cols['old_stock'])}{start_row}:{get_col_letter(cols['old_stock'])}{end_row}"
+        if VERBOSE:
+            log(old_price_values, "DEBUG")
+            log(old_stock_values, "DEBUG")
         log(f"    ↳ Old Price Range: {old_price_range}")
         log(f"    ↳ Old Stock Range: {old_stock_range}")
 
@@ -152,138 +211,128 @@ try:
             {'range': old_price_range, 'values': old_price_values},
             {'range': old_stock_range, 'values': old_stock_values}
         ]
-        safe_batch_update(sheet, updates)
-
-    log("✅ Old Price and Old Stock columns updated.\n")
-    time.sleep(2)
-
-    # --- ScrapingAnt HTML fetcher (Now using Scraper.do logic) ---
-    def fetch_html_with_scrapingant(url):
-        targetUrl = urllib.parse.quote(url)
-        # Using the exact way you provided
-        scrape_do_url = "http://api.scrape.do/?url={}&token={}".format(targetUrl, SCRAPER_DO_API_KEY)
-        
-        try:
-            response = requests.request("get", scrape_do_url, timeout=100)
-            if response.status_code != 200:
-                log(f"❌ Scraper.do failed ({response.status_code}) for {url}")
-                return None
-            return response.text
-        except Exception as e:
-            log(f"⚠️ Exception fetching {url}: {e}")
-            return None
-
-    # --- Walmart HTML Parser ---
-    def parse_walmart_html(html):
-        soup = BeautifulSoup(html, "html.parser")
-
-        # Seller
-        seller_tag = soup.find("span", attrs={"data-testid": "product-seller-info"})
-        seller_name = ""
-        if seller_tag:
-            link_tag = seller_tag.find("a", attrs={"data-testid": "seller-name-link"})
-            if link_tag:
-                seller_name = link_tag.get_text(strip=True)
-            else:
-                seller_name = seller_tag.get_text(strip=True).replace("Sold and shipped by", "").strip()
-            seller_name = re.sub(r'\.com.*$', '', seller_name).strip()
-
-        # Stock
-        stock_status = 0
-        low_stock_span = soup.find("span", class_="w_yTSq f7 f6-hdkp lh-solid lh-title-hdkp b dark-red w_0aYG w_MwbK")
-        if low_stock_span:
-            span_text = low_stock_span.get_text(strip=True)
-            match = re.search(r"(\d+)", span_text)
-            if match:
-                stock_status = match.group(1)
-            else:
-                stock_status = "10"
-        else:
-            unavailable_tag = soup.find("span", class_="b mr1")
-            # 1. Primary Check: Look at the unavailable_tag first
-            if unavailable_tag:
-                unavailable_text = unavailable_tag.get_text().strip()
-
-                # Case A: Explicit "Out of stock" -> Immediate 0
-                if "Out of stock" in unavailable_text:
-                    stock_status = 0
-                    print(f"    ↳ Detected 'Out of stock' directly.")
-                # Case B: "Not available" -> Dig deeper into fulfillment tag
-                elif "Not available" in unavailable_text:
-                    print(f"    ↳ Detected 'Not available', checking fulfillment tag...")
-                    # Look for the fulfillment tag (case-insensitive for 'shipping')
-                    fulfillment_tag = soup.find('div', attrs={'data-seo-id': re.compile(r'fulfillment-shipping-intent', re.IGNORECASE)})
-                    if fulfillment_tag:
-                        tag_text = fulfillment_tag.get_text().strip()
-                        print(f"      ↳ Fulfillment tag text: {tag_text}")
-                        # Sub-check 1: Still says out of stock
-                        if "Out of stock" in tag_text:
-                            stock_status = 0
-                            print(f"      ↳ Detected 'Out of stock' in fulfillment tag.")
-                        # Sub-check 2: Says "Arrives [Date]" -> In Stock
-                        elif "Arrives" in tag_text:
-                            stock_status = 100
-                            print(f"      ↳ Detected 'Arrives' in fulfillment tag, marking as in stock.")
+        write(updates)
+
+
+# --- STEP 2: Scraping ---
+class RowScraper:
+    """
+    Fetch + parse side of an updater run: scrape.do engine, page cache, parse
+    stage and the per-row aggregation. It only needs the scrape.do key and the
+    sheet values already loaded ({row number: values}), no Google credentials,
+    so it can be driven directly (e.g. against a mock SCRAPE_DO_ENDPOINT).
+    """
+
+    def __init__(self, api_key, data, cols, rate, parse_stage, parser_engine=None, page_cache=None,
+                 concurrency=MAX_CONCURRENCY, metrics=None, retry_policy=None, fingerprints=None, log=log):
+        from parsers import parse_walmart, walmart_fingerprint, WALMART_ENGINES, WALMART_PARSER_ENGINE
+
+        self.parser_engine = parser_engine or WALMART_PARSER_ENGINE
+        if self.parser_engine not in WALMART_ENGINES:
+            raise ValueError(f"Unknown parser engine '{self.parser_engine}', pick one of {sorted(WALMART_ENGINES)}")
+        self.parse = parse_walmart  # -> parsers.ProductInfo, shared with scraper.py
+        # Cached / fingerprinted results are per engine, like the single-flight entries
+        self.cache_parser = f"{CACHE_PARSER}:{self.parser_engine}"
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.api_key = api_key
+        self.data = data
+        self.cols = cols
+        self.rate = rate
+        self.parse_stage = parse_stage
+        self.page_cache = page_cache
+        self.fingerprints = fingerprints
+        self.fingerprint = walmart_fingerprint
+        self.concurrency = concurrency
+        self.metrics = metrics or Metrics(path=None, port=0)
+        self.log = log
+
+    async def scrape_walmart_link(self, engine, link):
+        """
+        Fetch + parse ONE Walmart link, refetching per the retry policy.
+        Returns a ProductInfo, with `failure` set to the retry_policy class that ended
+        the attempts (error=True when there was no usable page at all).
+        """
+        from parsers import ProductInfo
+
+        if self.page_cache:
+            cached = self.page_cache.get(link, self.cache_parser)
+            if cached:
+                if VERBOSE:
+                    self.log(f"    ↳ cache hit: {link}", "DEBUG")
+                self.metrics.count("cache_hit")
+                price, stock, seller = cached
+                return ProductInfo(price=price, stock=stock, seller=seller)
+
+        if VERBOSE:
+            self.log(f"    ↳ scraping: {link}", "DEBUG")
+
+        # One budget per failure class (network, 429, blocked, unavailable, selector miss)
+        tries = {}
+        while True:
+            html, failure = await engine.fetch_page(link)
+            stored = None
+            if failure:
+                info = ProductInfo(error=True)
             else:
-                stock_status = 100 if seller_tag else 0
-
-        # Price
-        price = None
-        price_tag = soup.find("span", attrs={"itemprop": "price", "data-seo-id": "hero-price"})
-        if price_tag:
-            price_text = price_tag.text.strip()
-            m = re.search(r"\$?([\d.,]+)", price_text)
-            if m:
-                price = round(float(m.group(1).replace(',', '')), 2)
-
-        return price, stock_status, seller_name
-
-
-    def scrape_multiple_walmart_links(links_str):
-        """Scrape one or more Walmart links, aggregate price/stock/seller."""
+                if self.fingerprints:
+                    fingerprint = self.fingerprint(html)
+                    stored = self.fingerprints.get(link, self.cache_parser, fingerprint)
+                if stored:
+                    # Same price / stock / seller regions as the last good parse, reuse its result
+                    self.metrics.count("parse_skipped")
+                    price, stock, seller = stored
+                    info = ProductInfo(price=price, in_stock=stock not in (0, "0"), stock=stock, seller=seller)
+                else:
+                    # Parsing is CPU work, hand the HTML to the process pool (it records the parse timings)
+                    info = await self.parse_stage.run_async(self.parse, html, self.parser_engine)
+                failure = classify_product(info)
+            delay = self.retry_policy.next_delay(failure, tries)
+            if delay is None:
+                break
+            self.log(f"      ⚠️ {failure} for {link}, refetching ({sum(tries.values())})...", "WARNING")
+            self.metrics.count("refetch", failure=failure)
+            await asyncio.sleep(delay)
+
+        if failure:
+            self.log(f"      ❌ Gave up on {link}: {failure} after {sum(tries.values()) + 1} fetch(es)", "ERROR")
+            self.metrics.count("gave_up", failure=failure)
+            return info._replace(failure=failure)
+
+        # Only good pages are cached, a miss must be refetched next time.
+        # SQLite commits block, so they run off the event loop
+        if self.page_cache:
+            await asyncio.to_thread(self.page_cache.put, link, self.cache_parser, (info.price, info.stock, info.seller))
+        if self.fingerprints and not stored:
+            await asyncio.to_thread(self.fingerprints.put, link, self.cache_parser, fingerprint,
+                                    (info.price, info.stock, info.seller))
+        return info
+
+    async def scrape_multiple_walmart_links(self, engine, links_str):
+        """Scrape one or more Walmart links concurrently, aggregate price/stock/seller."""
         links = re.split(r'[,\s|]+', links_str.strip())
         links = [l for l in links if l.startswith("http")]
 
+        if not links:
+            return "", 0, "", False
+
         total_price = 0.0
         stock_values = []
         sellers = set()
 
-        for link in links:
-            log(f"    ↳ scraping: {link}")
-            html = None
-
-            # --- Retry fetching HTML up to 3 times ---
-            for attempt in range(3):
-                html = fetch_html_with_scrapingant(link)
-                if html:
-                    break
-                log(f"      ⚠️ Fetch attempt {attempt+1} failed, retrying...")
-                time.sleep(10)
-
-            if not html:
-                log(f"      ❌ failed all 3 fetch attempts for {link}")
+        # All links of the cell share the engine's global budget, no delay between them.
+        # Identical products (same item ID) across rows are fetched once and fanned out.
+        link_results = await asyncio.gather(*(
+            engine.single_flight((product_key(link), self.parser_engine),
+                                 lambda link=link: self.scrape_walmart_link(engine, link), owner=self)
+            for link in links
+        ))
+
+        # A failed link is worth the retry phase only if it failed for a transient reason
+        retryable = any(is_transient(result.failure) for result in link_results)
+        for result in link_results:
+            if result.error:
                 continue
-
-            # --- Parse page (with retry if price missing) ---
-            price, stock, seller = parse_walmart_html(html)
-
-            # Retry price parse logic
-            if price is None:
-                log(f"      ⚠️ Price missing, retrying parse for {link}...")
-                retry_price = None
-                for attempt in range(2):
-                    time.sleep(10)
-                    html_retry = fetch_html_with_scrapingant(link)
-                    if not html_retry:
-                        continue
-                    price_retry, stock_retry, seller_retry = parse_walmart_html(html_retry)
-                    if price_retry is not None:
-                        price, stock, seller = price_retry, stock_retry, seller_retry
-                        retry_price = price_retry
-                        break
-                if retry_price is None:
-                    log(f"      ❌ Price still missing after 3 attempts for {link}")
-                    price = ""
+            price, stock, seller = result.price, result.stock, result.seller
 
             if price:
                 try:
@@ -292,7 +341,7 @@ try:
                     pass
             if seller:
                 sellers.add(seller)
-            
+
             if stock == 0:
                 stock_values.append(0)
             elif stock == 100:
@@ -303,11 +352,6 @@ try:
                 except:
                     stock_values.append(10)
 
-            time.sleep(5) # Delay between links in same cell
-
-        if not links:
-            return "", 0, ""
-
         final_price = round(total_price, 2) if total_price else ""
         final_stock = (
             0
@@ -316,130 +360,520 @@ try:
         )
         final_seller = ", ".join(sorted(sellers)) if sellers else ""
 
-        return final_price, final_stock, final_seller
+        return final_price, final_stock, final_seller, retryable
+
+    # --- Per-row scrape ---
+    async def process_row(self, engine, idx):
+        with self.metrics.time("row"):
+            return await self._process_row(engine, idx)
 
-    # --- Wrapper for concurrency ---
-    def process_row(idx):
-        if idx - 1 >= len(data):
+    async def _process_row(self, engine, idx):
+        row = self.data.get(idx)
+        if row is None:
             return idx, None, None, None, "OUT_OF_BOUNDS"
-        
-        row = data[idx - 1]
-        url_str = row[link_col - 1].strip()
-        
+
+        url_str = row[self.cols['link'] - 1].strip()
+
         if not url_str:
             return idx, "", 0, "", "SUCCESSFUL"
-            
-        log(f"🔍 Row {idx}: {url_str}")
-        price, stock, seller_name = scrape_multiple_walmart_links(url_str)
-        print(f"🔍 Row {idx}: price: {price}, stock: {stock}")
-        
+
+        if VERBOSE:
+            self.log(f"🔍 Row {idx}: {url_str}", "DEBUG")
+        try:
+            price, stock, seller_name, retryable = await self.scrape_multiple_walmart_links(engine, url_str)
+        except StopRequested:
+            raise
+        except Exception as e:
+            # One bad page must not abort every other row: keep the old values, try again in the retry phase
+            self.log(f"❌ Row {idx}: {type(e).__name__}: {e}", "ERROR")
+            self.metrics.count("row_errors")
+            price, stock, seller_name, retryable = "", 0, "", True
+        if VERBOSE:
+            self.log(f"🔍 Row {idx}: price: {price}, stock: {stock}", "DEBUG")
+
         flag_status = "SUCCESSFUL"
         if price == "" or price is None:
-            flag_status = "FAILED: Scraper Auto-Retry Again"
-            
+            # Unavailable / no-price pages come back the same, don't spend the retry phase on them
+            flag_status = "FAILED: Scraper Auto-Retry Again" if retryable else "FAILED: Manual Entry Required"
+
         # Fallbacks to old data if needed
+        old_price_col, buybox_col = self.cols['old_price'], self.cols['buybox']
         old_price = row[old_price_col - 1] if len(row) >= old_price_col else ""
         old_buybox = row[buybox_col - 1] if len(row) >= buybox_col else ""
-        
+
         if not price or price == "":
             price = old_price or ""
         if not stock:
             stock = 0
         if not seller_name or seller_name.strip() == "":
             seller_name = old_buybox or ""
-            
+
         return idx, price, stock, seller_name, flag_status
 
-    # --- STEP 2: Scraping Loop ---
-    log(f"🕷 Starting scrape for {len(target_rows)} rows in blocks of 100...\n")
-    batch_size = 3000 
-    failed_rows_indices = []
-    block_size = 50
-
-    # Process in blocks of 100
-    for b in range(0, len(target_rows), block_size):
-        block = target_rows[b:b + block_size]
-        log(f"📦 Processing Block: {block[0]} to {block[-1]}")
-        
-        # Use ThreadPoolExecutor for 5 concurrent requests within this block
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            results = list(executor.map(process_row, block))
-
-        # Collect all updates for this block of 100
-        block_updates = []
-        for idx, price, stock, seller_name, flag_status in results:
-            if flag_status == "OUT_OF_BOUNDS":
-                log(f"⚠️ Row {idx} out of bounds, skipping.")
-                continue
-                
-            if flag_status == "FAILED: Scraper Auto-Retry Again":
-                log(f"⚠️ Row {idx} failed to get price. Added to retry list.")
-                failed_rows_indices.append(idx)
-
-            log(f"✅ {idx}: price={price}, stock={stock}, buybox={seller_name}, flag={flag_status}")
-
-            # Handle building the updates list for the block
-            ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            block_updates.extend([
-                {'range': f"{get_col_letter(today_price_col)}{idx}", 'values': [[price]]},
-                {'range': f"{get_col_letter(today_stock_col)}{idx}", 'values': [[stock]]},
-                {'range': f"{get_col_letter(buybox_col)}{idx}", 'values': [[seller_name]]},
-                {'range': f"{get_col_letter(date_col)}{idx}", 'values': [[ts]]},
-                {'range': f"{get_col_letter(flag_col)}{idx}", 'values': [[flag_status]]}
-            ])
+    def open_engine(self):
+        """One FetchEngine (and keep-alive pool) for the whole job: `async with scraper.open_engine() as engine`."""
+        return FetchEngine(self.api_key, concurrency=self.concurrency, log=self.log, rate=self.rate, metrics=self.metrics)
+
+    async def scrape_rows(self, engine, rows, on_result):
+        """
+        Producer stage: scrapes `rows` on the shared engine. There are no
+        block barriers, every row is scheduled up front and each result is
+        handed to `on_result` as soon as it completes.
+        """
+        tasks = [asyncio.create_task(self.process_row(engine, idx)) for idx in rows]
+        for finished in asyncio.as_completed(tasks):
+            on_result(await finished)
+
+
+def date_update(cols, idx):
+    return {'range': f"{get_col_letter(cols['date'])}{idx}", 'values': [[datetime.now().strftime("%Y-%m-%d %H:%M:%S")]]}
+
+
+def row_updates(cols, idx, price, stock, seller_name, flag_status):
+    return [
+        {'range': f"{get_col_letter(cols['today_price'])}{idx}", 'values': [[price]]},
+        {'range': f"{get_col_letter(cols['today_stock'])}{idx}", 'values': [[stock]]},
+        {'range': f"{get_col_letter(cols['buybox'])}{idx}", 'values': [[seller_name]]},
+        date_update(cols, idx),
+        {'range': f"{get_col_letter(cols['flag'])}{idx}", 'values': [[flag_status]]}
+    ]
+
 
-        # Batch Write the entire block of 100 to the sheet
-        if block_updates:
-            log(f"📤 Writing Block ({len(block)} rows) to Google Sheets...")
-            safe_batch_update(sheet, block_updates)
-            log(f"✅ Block complete.\n")
-
-    log(f"🎉 Done! All rows scraped.")
-
-    # --- NEW: RETRY PHASE ---
-    final_failed_indices = [] # Track rows that failed AFTER retry
-
-    if failed_rows_indices:
-        log(f"\n🔄 --- RETRY PHASE: Attempting {len(failed_rows_indices)} failed rows again ---")
-        
-        # Retry with concurrency as well
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            retry_results = list(executor.map(process_row, failed_rows_indices))
-            
-        for idx, price, stock, seller_name, flag_status in retry_results:
+def row_unchanged(row, cols, price, stock, seller_name):
+    """True if the sheet row already shows this price / stock / buybox with a SUCCESSFUL flag."""
+    def cell(name):
+        col = cols[name]
+        return str(row[col - 1]).strip() if len(row) >= col else ""
+
+    try:
+        same_price = round(float(cell('today_price').replace("$", "").replace(",", "")), 2) == round(float(price), 2)
+    except ValueError:
+        return False
+    return (same_price and cell('today_stock') == str(stock) and cell('buybox') == seller_name
+            and cell('flag') == "SUCCESSFUL")
+
+
+# Stop button sends SIGTERM: unwind through run()'s finally so buffered rows are flushed
+class StopRequested(Exception):
+    pass
+
+
+def on_sigterm(signum, frame):
+    raise StopRequested("Stopped by user, rerun with --resume to continue")
+
+
+def tagged_log(name):
+    """log() with every line tagged [name], for processes running several jobs into one log."""
+    def tagged(msg, level="INFO"):
+        msg = str(msg)
+        body = msg.lstrip("\n")
+        log(f"{msg[:len(msg) - len(body)]}[{name}] {body}", level)
+    return tagged
+
+
+# --- Resources shared by every job of the process ---
+class SharedPool:
+    """
+    What all jobs of one process share: ONE scrape.do rate controller and, while
+    they run, ONE FetchEngine, so the proxy budget caps the whole fleet however
+    many sheets are updated; plus the parse stage, page cache, fingerprints and
+    metrics. Sheets writes are paced per spreadsheet: jobs on tabs of the same
+    spreadsheet share one controller, other spreadsheets do not wait for it.
+
+        pool = SharedPool(api_key)
+        jobs = [UpdateJob(options, pool, sheet).start(), ...]
+        try:
+            asyncio.run(pool.run(jobs))
+        finally:
+            for job in jobs: job.finish(...)
+            pool.close()
+    """
+
+    def __init__(self, api_key, use_cache=True, use_fingerprints=True, metrics_port=METRICS_PORT):
+        self.api_key = api_key
+
+        # --- Per-stage timings (scraper_metrics.jsonl, optional /metrics endpoint) ---
+        self.metrics = Metrics(port=metrics_port).serve()
+        if metrics_port:
+            log(f"📊 Metrics on http://127.0.0.1:{metrics_port}/metrics")
+
+        # One scrape.do controller for every job and phase, adapts concurrency on 429/5xx/timeouts
+        self.scrape_rate = RateController("scrape.do", max_concurrency=MAX_CONCURRENCY,
+                                          max_rate=SCRAPE_DO_MAX_RATE, log=log)
+        # Sheets allows ~60 write requests/min per user and every job writes as the same service
+        # account: one account-wide controller paces the per-spreadsheet ones
+        self.sheets_account_rate = RateController("Google Sheets (account)", max_concurrency=1,
+                                                  max_rate=SHEETS_MAX_WRITES_PER_SEC, log=log)
+        self.sheets_rates = {}  # spreadsheet -> RateController
+        self._lock = threading.Lock()
+
+        # --- Page cache (skip scrape.do for pages fetched recently) ---
+        self.page_cache = PageCache() if use_cache else None
+        if not use_cache:
+            log("💾 Page cache disabled (--no-cache)")
+        # --- Content fingerprints (skip parsing pages unchanged since their last good parse) ---
+        self.fingerprints = FingerprintStore() if use_fingerprints else None
+        # --- Parse processes (CPU stage) ---
+        self.parse_stage = ParseStage(PARSE_WORKERS, metrics=self.metrics)
+
+    def sheets_rate(self, spreadsheet):
+        """The Google Sheets RateController of `spreadsheet` (any key, e.g. its URL or ID)."""
+        with self._lock:
+            rate = self.sheets_rates.get(spreadsheet)
+            if rate is None:
+                # At most the account's rate, adapts on this spreadsheet's 429s (which slow the account too)
+                name = "Google Sheets" if not self.sheets_rates else f"Google Sheets #{len(self.sheets_rates) + 1}"
+                rate = self.sheets_rates[spreadsheet] = RateController(
+                    name, max_concurrency=1, max_rate=SHEETS_MAX_WRITES_PER_SEC, log=log,
+                    parent=self.sheets_account_rate)
+            return rate
+
+    def open_engine(self):
+        return FetchEngine(self.api_key, concurrency=MAX_CONCURRENCY, log=log, rate=self.scrape_rate,
+                           metrics=self.metrics)
+
+    async def run(self, jobs):
+        """
+        Scrapes every job concurrently on one engine. A job that fails is marked
+        (job.error) and the others go on; StopRequested stops them all.
+        """
+        async def scrape(job, engine):
             try:
-                if price and price != "":
-                    log(f"✅ Retry SUCCESS for Row {idx}! New Price: {price}")
-                    
-                    # SINGLE BATCH Update for Retry
-                    retry_updates = [
-                        {'range': f"{get_col_letter(today_price_col)}{idx}", 'values': [[price]]},
-                        {'range': f"{get_col_letter(today_stock_col)}{idx}", 'values': [[stock]]},
-                        {'range': f"{get_col_letter(buybox_col)}{idx}", 'values': [[seller_name]]},
-                        {'range': f"{get_col_letter(date_col)}{idx}", 'values': [[datetime.now().strftime("%Y-%m-%d %H:%M:%S")]]},
-                        {'range': f"{get_col_letter(flag_col)}{idx}", 'values': [["SUCCESSFUL"]]}
-                    ]
-                    safe_batch_update(sheet, retry_updates)
-                    
-                else:
-                    log(f"❌ Retry FAILED again for Row {idx}. Leaving fallback values.")
-                    final_failed_indices.append(idx)
-                    safe_batch_update(sheet, [{'range': f"{get_col_letter(flag_col)}{idx}", 'values': [["FAILED: Manual Entry Required"]]}])
+                await job.scrape(engine)
+            except StopRequested:
+                raise
             except Exception as e:
-                log(f"⚠️ Error during retry for row {idx}: {e}")
-                final_failed_indices.append(idx)
-
-    # --- FINAL REPORT ---
-    if final_failed_indices:
-        failed_str = ",".join(map(str, sorted(final_failed_indices)))
-        log(f"\n⚠️ FINAL FAILED ROWS: {failed_str}")
-        print(f"⚠️ FINAL FAILED ROWS: {failed_str}")
-
-    log(f"🎉 Done! All rows processed.")
-    if os.path.exists("start.txt"):
-        os.remove("start.txt")
-
-except Exception as e:
-    log(f" Fatal error: {e}")
-    if os.path.exists("start.txt"):
-        os.remove("start.txt")
\ No newline at end of file
+                job.error = e
+                job.log(f"❌ Job failed: {e}", "ERROR")
+
+        jobs_str = f" in {len(jobs)} jobs" if len(jobs) > 1 else ""
+        log(f"🕷 Starting scrape for {sum(len(job.target_rows) for job in jobs)} rows{jobs_str} "
+            f"(fetch concurrency {MAX_CONCURRENCY}, parse workers {PARSE_WORKERS})...\n")
+        async with self.open_engine() as engine:
+            await asyncio.gather(*(scrape(job, engine) for job in jobs))
+            if engine.dedup_hits:
+                log(f"🔗 {engine.dedup_hits} duplicate product links served from the in-flight map")
+
+    def close(self):
+        if self.page_cache:
+            log(f"💾 Page cache: {self.page_cache.hits} hits, {self.page_cache.misses} misses")
+            self.page_cache.close()
+        if self.fingerprints:
+            log(f"🧬 Fingerprints: {self.fingerprints.hits} unchanged pages not parsed, "
+                f"{self.fingerprints.misses} parsed")
+            self.fingerprints.close()
+        self.parse_stage.close()
+        log(f"📈 {self.scrape_rate.summary()}")
+        for rate in self.sheets_rates.values():
+            log(f"📈 {rate.summary()}")
+        if len(self.sheets_rates) > 1:
+            log(f"📈 {self.sheets_account_rate.summary()}")
+        for line in self.metrics.summary_lines():
+            log(f"📊 {line}")
+        self.metrics.close()
+
+
+# --- One sheet tab + row selection ---
+class UpdateJob:
+    """
+    One update job: a worksheet, its target rows and everything that is per
+    sheet (journal, writer thread, progress file, retry lists). The fetching,
+    parsing and caching go through the SharedPool.
+
+    The job goes window by window (options.window_rows target rows each, 0 = the
+    whole job as one window): read the window's cells, schedule them, copy
+    Today → Old, scrape, retry the failures, then forget the window. The next
+    window is read and copied while the current one scrapes, and memory stays
+    flat however many rows the job has.
+    """
+
+    BLOCK_SIZE = 50      # rows per batch write
+    FLUSH_INTERVAL = 15  # seconds, flush a partial block if rows trickle in slowly
+
+    def __init__(self, options, pool, sheet, sheet_url=TARGET_SHEET_URL, spreadsheet=None, name=None,
+                 journal_path=JOURNAL_FILE, progress_path=PROGRESS_FILE):
+        self.options = options
+        self.pool = pool
+        self.sheet = sheet
+        self.sheet_url = sheet_url
+        self.target_rows = options.target_rows
+        self.log = tagged_log(name) if name else log
+        self.sheets_rate = pool.sheets_rate(spreadsheet or sheet_url)
+        self.journal = RunJournal(journal_path)
+        self.progress_path = progress_path
+        self.started = time.monotonic()
+        self.error = None
+        self.completed = False
+        self.failed_rows_indices = []  # Rows of the current window waiting for the retry phase
+        self.final_failed_indices = []  # Rows that failed AFTER retry, or were not worth retrying
+
+    def write_batch(self, updates):
+        safe_batch_update(self.sheet, updates, self.sheets_rate, self.log, metrics=self.pool.metrics)
+
+    def start(self):
+        """Reads the header, opens the journal and starts the writer. Returns the job."""
+        options, journal, log = self.options, self.journal, self.log
+
+        # --- OPEN SHEET ---
+        # Header first, then only the run's columns for each window's rows (never the whole sheet)
+        self.header = read_header(self.sheet)
+        self.cols = sheet_columns(self.header)
+
+        # --- CHECKPOINT JOURNAL (--resume picks up a killed run) ---
+        # Keyed on the rows the user asked for, so a resumed run matches even though
+        # rows written meanwhile are no longer stale
+        self.resumed = journal.open(job_key(self.sheet_url, self.target_rows), resume=options.resume)
+        if self.resumed:
+            log(f"♻️ Resuming: {len(journal.flags)} rows already scraped, "
+                f"{len(journal.flags) - len(journal.unflushed)} written"
+                f"{', copy step done' if journal.copy_done else ''}")
+        elif options.resume:
+            log("♻️ No journal for this sheet/rows, starting a fresh run")
+
+        self.windows = chunked(self.target_rows, options.window_rows) if options.window_rows else [self.target_rows]
+        if len(self.windows) > 1:
+            log(f"🪟 Streaming {len(self.target_rows)} rows in {len(self.windows)} windows of {options.window_rows}")
+
+        # --- Walmart HTML Parser (see parsers.py, engine picked by --parser=json|lxml|soup) ---
+        try:
+            self.scraper = RowScraper(self.pool.api_key, {}, self.cols, self.pool.scrape_rate, self.pool.parse_stage,
+                                      parser_engine=options.parser_engine, page_cache=self.pool.page_cache,
+                                      metrics=self.pool.metrics, fingerprints=self.pool.fingerprints, log=log)
+        except Exception:
+            journal.close()
+            raise
+        log(f"🧩 Parser engine: {self.scraper.parser_engine}")
+
+        # Consumer stage: writes happen on the writer thread, quota sleeps never stall scraping.
+        # Every flushed batch is journaled, so --resume knows what reached the sheet.
+        self.writer = SheetWriter(self.write_batch, flush_rows=self.BLOCK_SIZE, flush_interval=self.FLUSH_INTERVAL,
+                                  log=log,
+                                  on_flush=journal.record_flushed).start()
+        # Rows done / failed, rows/min, ETA and current window for the frontend dashboard
+        self.progress = Progress(len(self.target_rows), windows=len(self.windows), metrics=self.pool.metrics,
+                                 writer=self.writer, path=self.progress_path)
+        return self
+
+    def load_window(self, rows):
+        """Reads, schedules and copies Today → Old for one window. Returns (rows to scrape, data)."""
+        options, cols, log = self.options, self.cols, self.log
+        data = read_rows(self.sheet, self.header, READ_COLUMNS, rows)
+        log(f"📥 Read {len(READ_COLUMNS)} columns for {len(data)} rows")
+
+        # --- SCHEDULING (--priority / --stale-hours=N), within the window when streaming ---
+        list_mode = options.is_list_mode
+        if options.prioritize or options.min_stale_hours is not None:
+            scheduled = schedule_rows(data, rows, cols,
+                                      prioritize=options.prioritize, min_stale_hours=options.min_stale_hours)
+            if options.min_stale_hours is not None:
+                log(f"🗓 {len(scheduled)}/{len(rows)} rows older than {options.min_stale_hours:g}h (or failed / never updated)")
+            if options.prioritize:
+                log(f"🗓 Priority order (stale / volatile / failed first): {scheduled[:10]}{'...' if len(scheduled) > 10 else ''}")
+            if len(scheduled) != len(rows):
+                # Copy Today → Old only for the rows that will actually be rescraped
+                list_mode = True
+            rows = scheduled
+
+        # Rows copied by a resumed run already hold the pre-run values in Old, copying again would overwrite them
+        copy_rows = [r_idx for r_idx in rows if not self.journal.copied(r_idx)] if self.resumed else rows
+        if len(copy_rows) < len(rows):
+            log(f"⏭ Today → Old copy already done in the resumed run for {len(rows) - len(copy_rows)} rows, skipping.\n")
+        if copy_rows:
+            log("🔁 Copying Today → Old columns...")
+            copy_today_to_old(self.write_batch, data, cols, copy_rows, list_mode or len(copy_rows) < len(rows), log=log)
+            self.journal.record_copy_done(row_runs(copy_rows))
+            log("✅ Old Price and Old Stock columns updated.\n")
+        return rows, data
+
+    def stream_row(self, result):
+        log, cols, metrics, journal = self.log, self.cols, self.pool.metrics, self.journal
+        idx, price, stock, seller_name, flag_status = result
+        if flag_status == "OUT_OF_BOUNDS":
+            log(f"⚠️ Row {idx} out of bounds, skipping.", "WARNING")
+            # Still one of the total's rows, done without a write
+            self.progress.row_done()
+            return
+
+        if flag_status == "FAILED: Scraper Auto-Retry Again":
+            log(f"⚠️ Row {idx} failed to get price. Added to retry list.", "WARNING")
+            self.failed_rows_indices.append(idx)
+        elif flag_status == "FAILED: Manual Entry Required":
+            log(f"⚠️ Row {idx}: no price and nothing worth refetching (unavailable / no valid link), not retrying.", "WARNING")
+            self.final_failed_indices.append(idx)
+
+        metrics.count("rows_scraped", flag=flag_status)
+        self.progress.row_done(failed=flag_status.startswith("FAILED"))
+
+        if (flag_status == "SUCCESSFUL" and not self.options.rewrite_unchanged
+                and row_unchanged(self.scraper.data.get(idx, []), cols, price, stock, seller_name)):
+            # Only the date stamp changes: it is the scheduler's "last checked" (--stale-hours / --priority),
+            # so it is still written, one cell that coalesces with its neighbours into one column range
+            log(f"✅ {idx}: unchanged (price={price}, stock={stock}, buybox={seller_name}), date only")
+            metrics.count("rows_unchanged")
+            updates = [date_update(cols, idx)]
+            journal.record_row("scrape", idx, flag_status, updates)
+            self.writer.submit(updates, key=("scrape", idx))
+            return
+
+        log(f"✅ {idx}: price={price}, stock={stock}, buybox={seller_name}, flag={flag_status}")
+        updates = row_updates(cols, idx, price, stock, seller_name, flag_status)
+        journal.record_row("scrape", idx, flag_status, updates)
+        self.writer.submit(updates, key=("scrape", idx))
+
+    # --- RETRY PHASE ---
+    def stream_retry_row(self, result):
+        log, cols = self.log, self.cols
+        idx, price, stock, seller_name, flag_status = result
+        if price and price != "":
+            log(f"✅ Retry SUCCESS for Row {idx}! New Price: {price}")
+            flag_status = "SUCCESSFUL"
+            updates = row_updates(cols, idx, price, stock, seller_name, flag_status)
+        else:
+            log(f"❌ Retry FAILED again for Row {idx}. Leaving fallback values.", "ERROR")
+            self.final_failed_indices.append(idx)
+            flag_status = "FAILED: Manual Entry Required"
+            updates = [{'range': f"{get_col_letter(cols['flag'])}{idx}", 'values': [[flag_status]]}]
+        self.pool.metrics.count("rows_retried", flag=flag_status)
+        self.progress.row_retried(recovered=flag_status == "SUCCESSFUL")
+        self.journal.record_row("retry", idx, flag_status, updates)
+        self.writer.submit(updates, key=("retry", idx))
+
+    def replay(self, phase, rows):
+        # Rows scraped by the killed run but never written: write them, don't refetch
+        pending = self.journal.pending_replay(phase, rows)
+        if pending:
+            self.log(f"♻️ Replaying {len(pending)} scraped-but-unwritten rows ({phase} phase)")
+        for idx, updates in pending:
+            self.writer.submit(updates, key=(phase, idx))
+
+    async def scrape_window(self, engine, rows):
+        log, journal = self.log, self.journal
+        window = set(rows)
+        self.replay("scrape", window)
+        self.failed_rows_indices[:] = journal.rows_flagged("scrape", "FAILED: Scraper Auto-Retry Again", window)
+        self.final_failed_indices.extend(journal.rows_flagged("scrape", "FAILED: Manual Entry Required", window))
+        rows_to_scrape = [idx for idx in rows if not journal.scraped("scrape", idx)]
+        if len(rows_to_scrape) < len(rows):
+            log(f"⏭ Skipping {len(rows) - len(rows_to_scrape)} rows completed by the resumed run")
+            self.progress.rows_skipped(len(rows) - len(rows_to_scrape))
+
+        await self.scraper.scrape_rows(engine, rows_to_scrape, self.stream_row)
+        log(f"🎉 Done! All rows scraped.")
+
+        self.replay("retry", window)
+        self.final_failed_indices.extend(journal.rows_flagged("retry", "FAILED: Manual Entry Required", window))
+        retry_rows = [idx for idx in self.failed_rows_indices if not journal.scraped("retry", idx)]
+        if retry_rows:
+            log(f"\n🔄 --- RETRY PHASE: Attempting {len(retry_rows)} failed rows again ---")
+            # Same engine and concurrency budget, but the failed products must really be refetched
+            engine.forget_finished(self.scraper)
+            await self.scraper.scrape_rows(engine, retry_rows, self.stream_retry_row)
+
+    async def scrape(self, engine):
+        """Every window of the job on the shared `engine`."""
+        if self.resumed and self.journal.done:
+            self.log("✅ Journaled run already completed, nothing to resume.")
+            self.completed = True
+            return
+        windows, scraper = self.windows, self.scraper
+        loading = asyncio.create_task(asyncio.to_thread(self.load_window, windows[0]))
+        for n in range(len(windows)):
+            rows, scraper.data = await loading
+            if n + 1 < len(windows):
+                # Read + copy the next window while this one scrapes
+                loading = asyncio.create_task(asyncio.to_thread(self.load_window, windows[n + 1]))
+            if len(windows) > 1:
+                self.log(f"🪟 Window {n + 1}/{len(windows)}: {len(rows)} rows")
+            self.progress.window(n + 1, rows, dropped=len(windows[n]) - len(rows))
+            await self.scrape_window(engine, rows)
+            # Done with this window, let its cells and results go
+            scraper.data = {}
+            engine.forget_finished(self.scraper)
+        self.completed = True
+
+    def finish(self, status=None):
+        """
+        Drains the writer and closes the journal / progress, even after a crash so
+        finished rows are not lost. `status` is what stopped the run ("stopped" /
+        "failed"), a job that had already completed or failed on its own keeps
+        that. Returns the final status: "done", "stopped" or "failed".
+        """
+        log, writer, journal = self.log, self.writer, self.journal
+        status = "failed" if self.error else "done" if self.completed else status or "failed"
+        writer.close()
+        self.pool.metrics.count("rows_written", writer.rows_written)
+        self.progress.finish(status)
+        if writer.failed_batches:
+            log(f"⚠️ {writer.failed_batches} batch writes failed, rerun with --resume to write them", "ERROR")
+        elif status == "done":
+            journal.record_done()
+        journal.close()
+        if status != "done":
+            return status
+
+        elapsed_min = (time.monotonic() - self.started) / 60
+        rows_per_min = len(self.target_rows) / elapsed_min if elapsed_min > 0 else 0
+        log(f"⏱ {len(self.target_rows)} rows in {elapsed_min:.1f} min ({rows_per_min:.1f} rows/min), "
+            f"{writer.batches_written} batch writes, {writer.failed_batches} failed")
+
+        # --- FINAL REPORT ---
+        if self.final_failed_indices:
+            failed_str = ",".join(map(str, sorted(self.final_failed_indices)))
+            log(f"\n⚠️ FINAL FAILED ROWS: {failed_str}", "WARNING")
+
+        log(f"🎉 Done! All rows processed.")
+        return status
+
+
+def run(options, sheet=None, api_key=None):
+    """
+    Runs one update job. `sheet` / `api_key` default to TARGET_SHEET_URL's first
+    tab and the scrape.do key from the secrets. See job_runner.py for several
+    sheets at once on one fetch pool.
+    """
+    api_key = api_key or get_secrets()["api_keys"]["scraper_do"]
+    if sheet is None:
+        sheet = get_client().open_by_url(TARGET_SHEET_URL).get_worksheet(0)
+
+    pool = SharedPool(api_key, use_cache=options.use_cache, use_fingerprints=options.use_fingerprints,
+                      metrics_port=options.metrics_port)
+    try:
+        job = UpdateJob(options, pool, sheet).start()
+    except Exception:
+        pool.close()
+        raise
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+    status = None
+    try:
+        asyncio.run(pool.run([job]))
+    except StopRequested:
+        status = "stopped"
+        raise
+    except BaseException:
+        status = "failed"
+        raise
+    finally:
+        job.finish(status)
+        pool.close()
+    if job.error:
+        raise job.error
+
+
+def main(argv=None):
+    # Clear old logs if running new session
+    open(LOG_FILE, "w").close()
+    log(" Walmart sheet updater started...")
+    try:
+        run(parse_args(sys.argv[1:] if argv is None else argv))
+    except Exception as e:
+        log(f" Fatal error: {e}", "ERROR")
+    finally:
+        if os.path.exists("start.txt"):
+            os.remove("start.txt")
+        get_run_log().close()
+
+
+if __name__ == "__main__":
+    main()